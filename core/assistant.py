@@ -9,6 +9,7 @@ from core import audioengine
 from core import commandline as interface
 from core import i18n
 from core import mic
+from core import multimic
 from core import paths
 from core import profile
 from core import visualizations
@@ -208,9 +209,22 @@ class Assistant:
             vad_slug,
             category='vad'
         )
-        vad_plugin = vad_info.plugin_class(self.input_device)
+        # Several microphones, each with its own voice activity
+        # detector. Only the clearest recording of an utterance is
+        # transcribed.
+        vad_plugin = None
+        capture = None
+        input_device_slugs = profile.get(['audio', 'input_devices'], [])
+        if len(input_device_slugs) > 1:
+            vad_plugins = [
+                vad_info.plugin_class(audio_engine.get_device_by_slug(slug))
+                for slug in input_device_slugs
+            ]
+            self.input_device = vad_plugins[0]._input_device
+            capture = multimic.CaptureMultiplexer(vad_plugins)
+        else:
+            vad_plugin = vad_info.plugin_class(self.input_device)
         # STT Engine
-        stt_thread = None
         active_stt_slug = profile.get_profile_var(
             ['active_stt', 'engine']
         )
@@ -239,18 +253,52 @@ class Assistant:
             input_device=self.input_device,
             active_stt_plugin=self.active_stt_plugin
         )
+        streaming = profile.get_profile_flag(['active_stt', 'streaming'], False)
+        if streaming and not self.active_stt_plugin.supports_streaming:
+            self._logger.warning(
+                "STT engine '{}' does not support streaming".format(
+                    active_stt_slug
+                )
+            )
+            streaming = False
+        if streaming and capture is not None:
+            self._logger.warning(
+                "Streaming is not available with more than one microphone"
+            )
+            streaming = False
         try:
-            while self.mic.Continue:
-                # put the audio in a queue and call the stt engine
-                self.mic.add_to_queue(vad_plugin.get_audio())
-                if not (stt_thread and hasattr(stt_thread, "is_alive") and stt_thread.is_alive()):
-                    # start the thread
-                    stt_thread = threading.Thread(
-                        target=self.mic.handle_vad_output
-                    )
-                    stt_thread.start()
+            if capture is not None:
+                self.mic.start_stt_workers()
+                capture.start()
+                while self.mic.Continue:
+                    # Every utterance is converted from the format of the
+                    # microphone that recorded it
+                    device, audio = capture.get_utterance()
+                    if device is None:
+                        break
+                    self.mic.add_to_queue(audio, device)
+            elif streaming:
+                # Feed the audio to the stt engine while it is being
+                # recorded, so the transcription is ready as soon as
+                # the speaker stops
+                self.mic.start_stream_worker()
+                while self.mic.Continue:
+                    vad_plugin.get_audio(stream=self.mic)
+            else:
+                # The STT workers keep running and take utterances from
+                # the queue as the VAD produces them
+                self.mic.start_stt_workers()
+                while self.mic.Continue:
+                    # put the audio in a queue for the stt workers
+                    self.mic.add_to_queue(vad_plugin.get_audio())
         except KeyboardInterrupt:
             self.mic.Continue = False
+        finally:
+            if capture is not None:
+                capture.stop()
+            self.mic.stop_stream_worker()
+            self.mic.stop_stt_workers()
+            visualizations.stop_dispatcher()
         visualizations.run_visualization(
             "output",
             "Exiting..."
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 import abc
 import contextlib
+import logging
 import slugify
+import threading
 import time
 import wave
 from core import profile
@@ -30,18 +32,100 @@ class DeviceNotFound(DeviceException):
     pass
 
 
+class DeviceRegistry(object):
+    """
+    Remembers the devices an audio engine found, so listing devices or
+    looking one up by slug does not enumerate the hardware again. The
+    same device objects are returned every time, which lets each device
+    cache the formats it supports.
+
+    Every rescan_interval seconds the engine's device_signature() is
+    compared with the one taken at the last enumeration. If it changed (a
+    device was plugged in or removed) the devices are enumerated again.
+    invalidate() forces that on the next lookup.
+    """
+
+    def __init__(self, engine, rescan_interval=5):
+        self._logger = logging.getLogger(__name__)
+        self._engine = engine
+        self._rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._devices = None
+        self._signature = None
+        self._checked = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._devices = None
+
+    def _current(self):
+        with self._lock:
+            now = time.monotonic()
+            if(
+                self._devices is not None
+                and now - self._checked >= self._rescan_interval
+            ):
+                self._checked = now
+                if self._engine.device_signature() != self._signature:
+                    self._logger.info("Audio devices changed, rescanning")
+                    self._devices = None
+            if self._devices is None:
+                self._signature = self._engine.device_signature()
+                self._devices = list(self._engine.enumerate_devices())
+                self._checked = now
+            return self._devices
+
+    def get_devices(self, device_type=DEVICE_TYPE_ALL):
+        devices = self._current()
+        if device_type == DEVICE_TYPE_ALL:
+            return list(devices)
+        return [device for device in devices if device_type in device.types]
+
+    def get_device_by_slug(self, slug):
+        for device in self._current():
+            if device.slug == slug:
+                return device
+        raise DeviceNotFound("Audio device with slug '%s' not found" % slug)
+
+
 class AudioEngine(object):
+    # Returns new device objects for every device the engine can see.
+    # Use get_devices() instead, which caches the result.
     @abc.abstractmethod
-    def get_devices(self, device_type=DEVICE_TYPE_ALL):
+    def enumerate_devices(self):
         pass
 
+    # A cheap value that changes when devices are added or removed. The
+    # default of None means changes are only picked up by
+    # refresh_devices().
+    def device_signature(self):
+        return None
+
+    @property
+    def device_registry(self):
+        try:
+            return self._device_registry
+        except AttributeError:
+            self._device_registry = DeviceRegistry(
+                self,
+                rescan_interval=float(
+                    profile.get(['audio', 'device_rescan_interval'], 5)
+                )
+            )
+            return self._device_registry
+
+    def refresh_devices(self):
+        self.device_registry.invalidate()
+
+    def get_devices(self, device_type=DEVICE_TYPE_ALL):
+        return self.device_registry.get_devices(device_type)
+
     @abc.abstractmethod
     def get_default_device(self, output=True):
         pass
 
-    @abc.abstractmethod
     def get_device_by_slug(self, slug):
-        pass
+        return self.device_registry.get_device_by_slug(slug)
 
 
 class AudioDevice(object):
@@ -73,6 +157,7 @@ class AudioDevice(object):
             )
         )
         self._stop = False
+        self._format_cache = {}
 
     @property
     def name(self):
@@ -98,6 +183,32 @@ class AudioDevice(object):
     def supports_format(self, bits, channels, rate, output=True):
         pass
 
+    # Same as supports_format(), but each combination is only probed once
+    def format_supported(self, bits, channels, rate, output=True):
+        key = (bits, channels, rate, bool(output))
+        try:
+            return self._format_cache[key]
+        except KeyError:
+            supported = bool(
+                self.supports_format(bits, channels, rate, output=output)
+            )
+            self._format_cache[key] = supported
+            return supported
+
+    def supported_formats(self, output=True):
+        formats = []
+        for bits in (8, 16, 24, 32):
+            for channels in (1, 2):
+                for rate in STANDARD_SAMPLE_RATES:
+                    if self.format_supported(
+                        bits,
+                        channels,
+                        rate,
+                        output=output
+                    ):
+                        formats.append((bits, channels, rate))
+        return formats
+
     @abc.abstractmethod
     @contextlib.contextmanager
     def open_stream(self, bits, channels, rate, chunksize=1024, output=True):
@@ -198,16 +309,13 @@ class AudioDevice(object):
                                        else 'No'))
         if verbose:
             for io_type in self.types:
-                direction = 'output' if DEVICE_TYPE_OUTPUT else 'input'
+                direction = (
+                    'output' if io_type == DEVICE_TYPE_OUTPUT else 'input'
+                )
                 print('  Supported %s formats:' % direction)
-                formats = []
-                for bits in (8, 16, 24, 32):
-                    for channels in (1, 2):
-                        for rate in STANDARD_SAMPLE_RATES:
-                            args = (bits, channels, rate)
-                            if self.supports_format(
-                                    *args, output=(direction == 'output')):
-                                formats.append(args)
+                formats = self.supported_formats(
+                    output=(direction == 'output')
+                )
                 if len(formats) == 0:
                     print('    None')
                 else:
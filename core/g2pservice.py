@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Long-lived grapheme to phoneme (G2P) services.
+
+Compiling a vocabulary asks Phonetisaurus for the pronunciation of every
+word that is not in the dictionary. Starting phonetisaurus-g2pfst loads
+the whole FST model first, which takes longer than predicting the words.
+
+A G2PService loads the model once through the Phonetisaurus Python
+binding (PhonetisaurusScript, built with Phonetisaurus
+--enable-python) and keeps it for the life of the process. Every plugin
+that uses the same model file gets the same service from get_service().
+
+If the binding is not installed or can not load the model, the service
+passes each batch of words to the fallback the plugin gives it, which
+usually runs the command line tool once for the whole batch.
+"""
+import logging
+import os
+import threading
+
+try:
+    from Phonetisaurus import PhonetisaurusScript
+except ImportError:
+    PhonetisaurusScript = None
+
+
+# The same settings the plugins pass to phonetisaurus-g2pfst
+BEAM = 1000
+THRESHOLD = 99.0
+ACCUMULATE = True
+PMASS = 0.85
+
+# SymbolTable::Find() returns this for symbols it does not know
+NO_SYMBOL = -1
+
+_services = {}
+_lock = threading.Lock()
+
+
+def _service_key(fst_model):
+    path = os.path.realpath(fst_model)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    # A retrained model gets a new service
+    return (path, mtime)
+
+
+def get_service(fst_model):
+    """
+    Returns the G2P service for the FST model at fst_model, creating it
+    the first time the model is used.
+    """
+    key = _service_key(fst_model)
+    with _lock:
+        service = _services.get(key)
+        if service is None:
+            for old_key in [k for k in _services if k[0] == key[0]]:
+                del _services[old_key]
+            service = G2PService(key[0])
+            _services[key] = service
+        return service
+
+
+class G2PService(object):
+    def __init__(self, fst_model):
+        self._logger = logging.getLogger(__name__)
+        self.fst_model = fst_model
+        self._model = None
+        self._loaded = False
+        # PhonetisaurusScript is not thread safe
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._loaded:
+            return self._model
+        self._loaded = True
+        if PhonetisaurusScript is None:
+            self._logger.debug(
+                "Phonetisaurus Python binding not installed, using the "
+                "fallback for '%s'",
+                self.fst_model
+            )
+            return None
+        try:
+            self._logger.info("Loading G2P model '%s'", self.fst_model)
+            self._model = PhonetisaurusScript(self.fst_model)
+        except Exception as e:
+            self._logger.warning(
+                "Unable to load G2P model '%s' (%s), using the fallback",
+                self.fst_model,
+                e
+            )
+            self._model = None
+        return self._model
+
+    def translate(self, words, nbest=None, fallback=None):
+        """
+        Predicts the pronunciations of a batch of words.
+
+        Arguments:
+            words -- a list of words
+            nbest -- (optional) the number of pronunciations to return for
+                     each word (Default: 1)
+            fallback -- (optional) a function taking (words, nbest) and
+                        returning the same thing as this method, used when
+                        the model can not be loaded in this process
+
+        Returns:
+            A dictionary of word: [pronunciation, ...] where each
+            pronunciation is a string of phonemes separated by spaces.
+            Words Phonetisaurus has no pronunciation for are left out,
+            including words with letters that are not in the model's
+            input symbols table.
+        """
+        # Every word only needs to be predicted once
+        words = list(dict.fromkeys(words))
+        if not words:
+            return {}
+        with self._lock:
+            model = self._load()
+            if model is None:
+                if fallback is None:
+                    raise OSError(
+                        "No G2P engine available for '{}'".format(
+                            self.fst_model
+                        )
+                    )
+                return fallback(words, nbest)
+            result = {}
+            for word in words:
+                unknown = [
+                    letter for letter in word
+                    if model.FindIsym(letter) == NO_SYMBOL
+                ]
+                if unknown:
+                    # phonetisaurus-g2pfst fails the whole batch here, the
+                    # caller can look for the missing words again
+                    self._logger.debug(
+                        "Input symbols %s of '%s' not found",
+                        unknown,
+                        word
+                    )
+                    continue
+                pronunciations = []
+                for path in model.Phoneticize(
+                    word,
+                    nbest or 1,
+                    BEAM,
+                    THRESHOLD,
+                    False,
+                    ACCUMULATE,
+                    PMASS
+                ):
+                    pronunciations.append(" ".join(
+                        model.FindOsym(symbol) for symbol in path.Uniques
+                    ))
+                if pronunciations:
+                    result[word] = pronunciations
+            return result
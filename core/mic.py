@@ -1,85 +1,274 @@
 import collections
-import contextlib
-import tempfile
+import logging
+import queue
 import threading
-import wave
 from core import profile
+from core import resample
 from core import visualizations
-from datetime import datetime
 
 
 class Mic:
     def __init__(self, *args, **kwargs):
         self._input_device = kwargs['input_device']
         self.active_stt_plugin = kwargs['active_stt_plugin']
-        self.recordings_queue = collections.deque([], maxlen=10)
+        self._logger = logging.getLogger(__name__)
+        # Utterances waiting to be transcribed. When the queue is full the
+        # capture thread waits for a free slot instead of dropping audio.
+        self.recordings_queue = queue.Queue(
+            maxsize=int(profile.get(['stt', 'queue_size'], 10))
+        )
+        self.stt_threads = []
+        # Every utterance gets a number when it is queued, and the workers
+        # handle their transcriptions in that order even if a later one
+        # finishes first
+        self._next_utterance = 0
+        self._next_transcription = 0
+        self._utterance_lock = threading.Lock()
+        self._transcription_turn = threading.Condition()
+        # Serializes transcribe_pcm() for STT plugins that are not thread
+        # safe
+        self._stt_lock = threading.Lock()
+        # Audio for streaming recognition, in the order it was captured
+        self.stream_queue = queue.Queue()
+        self.stream_thread = None
         self.actions_queue = collections.deque([], maxlen=10)
         self.actions_thread = None
         self.Continue = True
 
-    def add_to_queue(self, audio):
-        self.recordings_queue.appendleft(audio)
-
-    @contextlib.contextmanager
-    def _write_frames_to_file(self, frames, volume):
-        with tempfile.NamedTemporaryFile(
-            mode='w+b',
-            suffix=".wav",
-            prefix=datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        ) as f:
-            wav_fp = wave.open(f, 'wb')
-            wav_fp.setnchannels(self._input_device._input_channels)
-            wav_fp.setsampwidth(int(self._input_device._input_bits / 8))
-            wav_fp.setframerate(self._input_device._input_rate)
-            fragment = b''.join(frames)
-            if volume is not None:
-                maxvolume = audioop.minmax(
-                    fragment,
-                    self._input_device._input_bits / 8
-                )[1]
-                fragment = audioop.mul(
-                    fragment,
-                    int(self._input_device._input_bits / 8),
-                    volume * (2. ** 15) / maxvolume
+    @property
+    def backlog(self):
+        return self.recordings_queue.qsize()
+
+    # device is the input device the audio was recorded on, if it is not
+    # the Mic's own input device
+    def add_to_queue(self, audio, device=None):
+        with self._utterance_lock:
+            utterance = (self._next_utterance, audio, device)
+            self._next_utterance += 1
+        try:
+            self.recordings_queue.put_nowait(utterance)
+        except queue.Full:
+            self._logger.warning(
+                " ".join([
+                    "Speech to text is falling behind ({} utterances",
+                    "waiting), pausing audio capture"
+                ]).format(self.backlog)
+            )
+            self.recordings_queue.put(utterance)
+        else:
+            if self.backlog > len(self.stt_threads):
+                self._logger.info(
+                    "{} utterances waiting for speech to text".format(
+                        self.backlog
+                    )
                 )
 
-            wav_fp.writeframes(fragment)
-            wav_fp.close()
-            f.seek(0)
-            yield f
+    # Start a fixed number of threads that take utterances from the
+    # recordings queue and transcribe them for as long as we are running.
+    def start_stt_workers(self, count=None):
+        if count is None:
+            count = int(profile.get(['stt', 'workers'], 1))
+        for i in range(max(count, 1)):
+            stt_thread = threading.Thread(
+                target=self.handle_vad_output,
+                name="stt-worker-{}".format(i)
+            )
+            stt_thread.start()
+            self.stt_threads.append(stt_thread)
+
+    def stop_stt_workers(self):
+        # One None per worker tells it to exit once the utterances
+        # queued before it have been transcribed
+        for stt_thread in self.stt_threads:
+            self.recordings_queue.put(None)
+        for stt_thread in self.stt_threads:
+            stt_thread.join()
+        self.stt_threads = []
+
+    # Returns a Resampler that converts from the input device's rate to
+    # the rate the STT engine expects, or None if they already match
+    def get_resampler(self, device=None):
+        if device is None:
+            device = self._input_device
+        if device._input_rate == self.active_stt_plugin._samplerate:
+            return None
+        return resample.Resampler(
+            device._input_rate,
+            self.active_stt_plugin._samplerate,
+            int(device._input_bits / 8),
+            device._input_channels
+        )
 
-    def listen(self):
+    def listen(self, audio, device=None):
         transcription = ""
-        audio = self.recordings_queue.pop()
-        if len(audio)>0:
-            with self._write_frames_to_file(audio, None) as f:
-                transcription = self.active_stt_plugin.transcribe(f)[0]
+        if device is None:
+            device = self._input_device
+        if len(audio) > 0:
+            rate = device._input_rate
+            resampler = self.get_resampler(device)
+            if resampler is not None:
+                audio = resampler.process(audio) + resampler.flush()
+                rate = resampler.to_rate
+            # Hand the audio to the STT engine in memory, without writing
+            # a wav file first
+            transcribe_args = (
+                audio,
+                rate,
+                int(device._input_bits / 8),
+                device._input_channels
+            )
+            if getattr(self.active_stt_plugin, 'thread_safe', False):
+                transcribed = self.active_stt_plugin.transcribe_pcm(
+                    *transcribe_args
+                )
+            else:
+                with self._stt_lock:
+                    transcribed = self.active_stt_plugin.transcribe_pcm(
+                        *transcribe_args
+                    )
+            if len(transcribed) > 0:
+                transcription = transcribed[0]
         return transcription
 
+    def handle_transcription(self, transcription):
+        if len(transcription) > 0:
+            visualizations.run_visualization(
+                "output",
+                f"<< {transcription}"
+            )
+        else:
+            visualizations.run_visualization(
+                "output",
+                f"<< <noise>"
+            )
+        if any(map(lambda v: v in transcription, ["shut down", "shutdown", "turn off", "quit"])):
+            self.say("okay, quitting")
+            profile.set_arg('resetmic', True)
+            self.Continue = False
+        if transcription.startswith("say "):
+            # start a speak thread
+            self.say("here is what you said to say")
+            self.say(transcription[4:])
+
     def handle_vad_output(self):
         while True:
+            utterance = self.recordings_queue.get()
             try:
-                transcription = self.listen()
-                if len(transcription) > 0:
-                    visualizations.run_visualization(
-                        "output",
-                        f"<< {transcription}"
+                if utterance is None:
+                    break
+                number, audio, device = utterance
+                transcription = None
+                try:
+                    transcription = self.listen(audio, device)
+                except Exception:
+                    # Keep the worker alive for the next utterance
+                    self._logger.error(
+                        "Error while transcribing audio",
+                        exc_info=True
                     )
-                else:
-                    visualizations.run_visualization(
-                        "output",
-                        f"<< <noise>"
+                with self._transcription_turn:
+                    while self._next_transcription != number:
+                        self._transcription_turn.wait()
+                try:
+                    if transcription is not None:
+                        self.handle_transcription(transcription)
+                except Exception:
+                    self._logger.error(
+                        "Error while handling transcription",
+                        exc_info=True
                     )
-                if any(map(lambda v: v in transcription, ["shut down", "shutdown", "turn off", "quit"])):
-                    self.say("okay, quitting")
-                    profile.set_arg('resetmic', True)
-                    self.Continue = False
-                if transcription.startswith("say "):
-                    # start a speak thread
-                    self.say("here is what you said to say")
-                    self.say(transcription[4:])
-            except IndexError:
+                finally:
+                    with self._transcription_turn:
+                        self._next_transcription += 1
+                        self._transcription_turn.notify_all()
+            finally:
+                self.recordings_queue.task_done()
+
+    # Streaming recognition. VADPlugin.get_audio(stream=mic) calls
+    # start_stream(), feed_stream(), end_stream() and cancel_stream()
+    # from the capture thread while an utterance is being recorded.
+    # The audio is passed on to the STT engine by a separate thread so
+    # decoding never holds up capture.
+    def start_stream(self, audio):
+        self.stream_queue.put(("start", audio))
+
+    def feed_stream(self, frame):
+        self.stream_queue.put(("feed", frame))
+
+    def end_stream(self):
+        self.stream_queue.put(("end", None))
+
+    def cancel_stream(self):
+        self.stream_queue.put(("cancel", None))
+
+    def start_stream_worker(self):
+        self.stream_thread = threading.Thread(
+            target=self.handle_stream,
+            name="stt-stream"
+        )
+        self.stream_thread.start()
+
+    def stop_stream_worker(self):
+        if self.stream_thread is not None:
+            self.stream_queue.put(None)
+            self.stream_thread.join()
+            self.stream_thread = None
+
+    def handle_stream(self):
+        stt_plugin = self.active_stt_plugin
+        partial = ""
+        streaming = False
+        resampler = self.get_resampler()
+        rate = self._input_device._input_rate
+        if resampler is not None:
+            rate = resampler.to_rate
+        while True:
+            item = self.stream_queue.get()
+            if item is None:
                 break
+            event, audio = item
+            try:
+                if event == "start":
+                    if resampler is not None:
+                        resampler.reset()
+                    stt_plugin.start_stream(
+                        rate,
+                        int(self._input_device._input_bits / 8),
+                        self._input_device._input_channels
+                    )
+                    streaming = True
+                    partial = ""
+                if not streaming:
+                    # The utterance was abandoned after an error
+                    continue
+                if event in ("start", "feed"):
+                    if resampler is not None:
+                        audio = resampler.process(audio)
+                    text = stt_plugin.feed_stream(audio)
+                    if text and text != partial:
+                        partial = text
+                        self._logger.debug("Partial: {}".format(partial))
+                        visualizations.run_visualization(
+                            "partial_transcription",
+                            partial
+                        )
+                elif event == "cancel":
+                    streaming = False
+                    stt_plugin.cancel_stream()
+                elif event == "end":
+                    streaming = False
+                    if resampler is not None:
+                        stt_plugin.feed_stream(resampler.flush())
+                    transcribed = stt_plugin.end_stream()
+                    self.handle_transcription(
+                        transcribed[0] if len(transcribed) > 0 else ""
+                    )
+            except Exception:
+                streaming = False
+                self._logger.error(
+                    "Error while transcribing audio stream",
+                    exc_info=True
+                )
 
     def say(self, phrase):
         self.actions_queue.appendleft(lambda: self.tts(phrase))
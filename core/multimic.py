@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Capture from several microphones at the same time.
+
+Every input device gets its own voice activity detector, running
+get_audio() on its own thread. When one of them returns an utterance the
+others get a short window to report the same speech, and only the
+recording with the best signal to noise ratio is passed on, so the
+speech to text engine does not transcribe the same words once per
+microphone.
+"""
+import logging
+import queue
+import threading
+import time
+from core import pcm
+from core import profile
+
+
+# How often get_utterance() checks that capture is still running
+POLL_INTERVAL = 0.5
+
+
+class CaptureMultiplexer(object):
+    def __init__(self, vad_plugins, window=None):
+        """
+        Arguments:
+            vad_plugins -- a list of VADPlugin instances, one for each
+                           input device
+            window -- (optional) how long (in seconds) to wait for the
+                      other microphones after the first one finished an
+                      utterance (Default: profile audio.multimic_window,
+                      or 0.5)
+        """
+        self._logger = logging.getLogger(__name__)
+        self._vad_plugins = list(vad_plugins)
+        if window is None:
+            window = profile.get(['audio', 'multimic_window'], 0.5)
+        self._window = float(window)
+        self._utterances = queue.Queue()
+        self._threads = []
+        self._running = False
+
+    def start(self):
+        self._running = True
+        for vad_plugin in self._vad_plugins:
+            thread = threading.Thread(
+                target=self._capture,
+                args=(vad_plugin,),
+                name="capture-{}".format(vad_plugin._input_device.slug),
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    # The capture threads are blocked inside get_audio() most of the time,
+    # and the voice activity detectors only return from it early when
+    # resetmic is set. Setting it makes every thread finish its current
+    # chunk and exit.
+    def stop(self, timeout=5):
+        self._running = False
+        profile.set_arg('resetmic', True)
+        for thread in self._threads:
+            thread.join(timeout)
+            if thread.is_alive():
+                self._logger.warning(
+                    "Capture thread '{}' did not stop".format(thread.name)
+                )
+        self._threads = []
+
+    def _capture(self, vad_plugin):
+        device = vad_plugin._input_device
+        bytes_per_sample = int(device._input_bits / 8)
+        chunklength = device._input_chunksize * device._input_channels
+        try:
+            while self._running:
+                try:
+                    audio = vad_plugin.get_audio()
+                except Exception as e:
+                    self._logger.error(
+                        "Capture from '{}' failed: {}".format(device.slug, e),
+                        exc_info=True
+                    )
+                    time.sleep(1)
+                    continue
+                if not audio:
+                    if profile.get_arg('resetmic', False):
+                        # The microphone is being reset
+                        break
+                    continue
+                snr = pcm.snr(
+                    audio,
+                    bytes_per_sample,
+                    chunklength,
+                    device._input_channels
+                )
+                self._utterances.put((time.monotonic(), device, audio, snr))
+        finally:
+            # Wakes up get_utterance() so it can notice we stopped
+            self._utterances.put(None)
+
+    def _alive(self):
+        return self._running and any(
+            thread.is_alive() for thread in self._threads
+        )
+
+    def get_utterance(self):
+        """
+        Waits for the next utterance from any of the microphones.
+
+        Returns:
+            A (device, audio) tuple with the recording of the utterance
+            with the highest signal to noise ratio and the input device
+            it was recorded on, or (None, b'') once capture has stopped
+        """
+        first = None
+        while first is None:
+            try:
+                first = self._utterances.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
+            if first is None and not self._alive():
+                return (None, b'')
+        candidates = [first]
+        deadline = first[0] + self._window
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                candidate = self._utterances.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if candidate is not None:
+                candidates.append(candidate)
+        best = max(candidates, key=lambda candidate: candidate[3])
+        self._logger.debug(
+            "Using '{}' ({:.1f} dB), heard by {} of {} microphones".format(
+                best[1].slug,
+                best[3],
+                len(candidates),
+                len(self._vad_plugins)
+            )
+        )
+        return (best[1], best[2])
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Builds n-gram language models in the ARPA format.
+
+The vocabularies of the STT plugins are short lists of phrases, so the
+counts are kept in memory and the model is written to the ARPA file in
+a single pass, without running any external tools.
+
+Two kinds of smoothing are available:
+
+    witten_bell - interpolated Witten-Bell. Every context keeps back a
+                  share of its probability mass proportional to the
+                  number of different words seen after it. Works well
+                  on the tiny corpora made from intent phrases.
+    good_turing - Katz backoff with Good-Turing discounting of counts
+                  up to 7, as used by the CMU-Cambridge toolkit. On small
+                  corpora the discounts are often undefined. Discounting
+                  is then turned off for that order, like the toolkit
+                  does.
+
+The vocabulary is closed: every word the model knows is in the phrases.
+"""
+import collections
+import logging
+import math
+
+
+SENTENCE_START = '<s>'
+SENTENCE_END = '</s>'
+# Counts up to this are discounted with Good-Turing
+GOOD_TURING_MAX = 7
+# The log probability written for impossible events
+LOG_ZERO = -99.0
+
+
+def _log10(value):
+    return math.log10(value) if value > 0 else LOG_ZERO
+
+
+class LanguageModel(object):
+    def __init__(self, sentences, order=3, smoothing='witten_bell'):
+        """
+        Arguments:
+            sentences -- a list of sentences, each a list of words
+            order -- (optional) the longest n-gram (Default: 3)
+            smoothing -- (optional) 'witten_bell' or 'good_turing'
+                         (Default: 'witten_bell')
+        """
+        if smoothing not in ('witten_bell', 'good_turing'):
+            raise ValueError(
+                "Unknown smoothing '{}'".format(smoothing)
+            )
+        self._logger = logging.getLogger(__name__)
+        self.order = order
+        self.smoothing = smoothing
+        # counts[n][ngram] for n = 1 .. order
+        self.counts = [None] + [
+            collections.Counter() for n in range(order)
+        ]
+        for sentence in sentences:
+            tokens = [SENTENCE_START] + list(sentence) + [SENTENCE_END]
+            for n in range(1, order + 1):
+                counts = self.counts[n]
+                for start in range(len(tokens) - n + 1):
+                    counts[tuple(tokens[start:start + n])] += 1
+        # probabilities[n][ngram] and backoffs[n][ngram], not in log
+        self.probabilities = [None] + [{} for n in range(order)]
+        self.backoffs = [None] + [{} for n in range(order)]
+        self._estimate()
+
+    @property
+    def words(self):
+        """
+        Returns:
+            A sorted list of the words in the model, without the sentence
+            start and end markers.
+        """
+        return sorted(
+            ngram[0] for ngram in self.counts[1]
+            if ngram[0] not in (SENTENCE_START, SENTENCE_END)
+        )
+
+    def probability(self, ngram):
+        """
+        Returns:
+            The probability of the last word of ngram following the
+            others, backing off to shorter n-grams the way a decoder
+            reading the ARPA file does.
+        """
+        ngram = tuple(ngram)
+        n = len(ngram)
+        if ngram in self.probabilities[n]:
+            return self.probabilities[n][ngram]
+        if n == 1:
+            return 0.0
+        return self.backoffs[n - 1].get(ngram[:-1], 1.0) * self.probability(
+            ngram[1:]
+        )
+
+    def _contexts(self, n):
+        # Returns {context: {word: count}} for the n-grams of order n
+        contexts = collections.defaultdict(dict)
+        for ngram, count in self.counts[n].items():
+            contexts[ngram[:-1]][ngram[-1]] = count
+        return contexts
+
+    def _discounts(self, n):
+        # Good-Turing discount for every count up to GOOD_TURING_MAX,
+        # or None if they are not usable for this order
+        counts_of_counts = collections.Counter(
+            count for ngram, count in self.counts[n].items()
+            if ngram[-1] != SENTENCE_START
+        )
+        k = GOOD_TURING_MAX
+        n1 = counts_of_counts[1]
+        if n1 == 0:
+            return None
+        common = (k + 1) * counts_of_counts[k + 1] / n1
+        discounts = {}
+        for r in range(1, k + 1):
+            if counts_of_counts[r] == 0:
+                continue
+            discount = (
+                (r + 1) * counts_of_counts[r + 1] / (r * counts_of_counts[r])
+                - common
+            ) / (1 - common) if common != 1 else 0
+            if not 0 < discount <= 1:
+                self._logger.debug(
+                    "Good-Turing discount for {}-grams seen {} times is {}, "
+                    "not discounting {}-grams".format(n, r, discount, n)
+                )
+                return None
+            discounts[r] = discount
+        return discounts
+
+    def _estimate(self):
+        # Unigrams, the sentence start is never predicted
+        unigrams = {
+            ngram: count for ngram, count in self.counts[1].items()
+            if ngram[0] != SENTENCE_START
+        }
+        total = sum(unigrams.values())
+        types = len(unigrams)
+        probabilities = self.probabilities[1]
+        if self.smoothing == 'witten_bell':
+            # Interpolated with the uniform distribution over the vocabulary
+            for ngram, count in unigrams.items():
+                probabilities[ngram] = (count + 1) / (total + types)
+        else:
+            discounts = self._discounts(1) or {}
+            for ngram, count in unigrams.items():
+                probabilities[ngram] = discounts.get(count, 1) * count / total
+            # Closed vocabulary, the mass kept back goes to all words alike
+            left = 1 - sum(probabilities.values())
+            for ngram in probabilities:
+                probabilities[ngram] += left / types
+        probabilities[(SENTENCE_START,)] = 0.0
+
+        for n in range(2, self.order + 1):
+            contexts = self._contexts(n)
+            probabilities = self.probabilities[n]
+            backoffs = self.backoffs[n - 1]
+            discounts = None
+            if self.smoothing == 'good_turing':
+                discounts = self._discounts(n) or {}
+            for context, followers in contexts.items():
+                seen = sum(followers.values())
+                if self.smoothing == 'witten_bell':
+                    kinds = len(followers)
+                    backoff = kinds / (seen + kinds)
+                    for word, count in followers.items():
+                        probabilities[context + (word,)] = (
+                            count + kinds * self.probability(
+                                context[1:] + (word,)
+                            )
+                        ) / (seen + kinds)
+                    backoffs[context] = backoff
+                else:
+                    left = 1.0
+                    lower = 0.0
+                    for word, count in followers.items():
+                        probability = discounts.get(count, 1) * count / seen
+                        probabilities[context + (word,)] = probability
+                        left -= probability
+                        lower += self.probability(context[1:] + (word,))
+                    if left <= 1e-12 or lower >= 1 - 1e-12:
+                        backoffs[context] = 0.0
+                    else:
+                        backoffs[context] = left / (1 - lower)
+
+    def write_arpa(self, f):
+        """
+        Writes the model to the file object f in the ARPA format.
+        """
+        f.write("\n\\data\\\n")
+        for n in range(1, self.order + 1):
+            f.write("ngram {}={}\n".format(n, len(self.probabilities[n])))
+        for n in range(1, self.order + 1):
+            f.write("\n\\{}-grams:\n".format(n))
+            backoffs = self.backoffs[n] if n < self.order else {}
+            for ngram in sorted(self.probabilities[n]):
+                line = "{:.4f} {}".format(
+                    _log10(self.probabilities[n][ngram]),
+                    " ".join(ngram)
+                )
+                if ngram in backoffs:
+                    line += " {:.4f}".format(_log10(backoffs[ngram]))
+                f.write(line + "\n")
+        f.write("\n\\end\\\n")
+
+
+def compile_arpa(phrases, output_file, order=3, smoothing='witten_bell'):
+    """
+    Builds a language model from phrases and writes it to output_file.
+
+    Arguments:
+        phrases -- a list of phrases, the words separated by spaces
+        output_file -- the path of the ARPA file to write
+        order -- (optional) the longest n-gram (Default: 3)
+        smoothing -- (optional) 'witten_bell' or 'good_turing'
+
+    Returns:
+        A sorted list of all unique words in the phrases.
+    """
+    model = LanguageModel(
+        [phrase.split() for phrase in phrases if phrase.strip()],
+        order=order,
+        smoothing=smoothing
+    )
+    with open(output_file, "w") as f:
+        model.write_arpa(f)
+    return model.words
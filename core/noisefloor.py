@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Noise floor estimators for the voice activity detectors.
+
+A voice activity detector compares the level of every frame against the
+typical level of the room. The estimators here keep track of that
+typical level (mean) and how much it varies (stddev) as frames come in.
+They all use constant memory and constant time per frame.
+
+    histogram - counts every value and halves the counts once more than
+                100 have been seen. This is what the detectors did
+                before, the halving makes the threshold jump.
+    ema - exponentially weighted mean and variance. Old frames fade out
+          smoothly over time_constant seconds.
+
+The estimator is picked with noise_floor.estimator in the profile.
+"""
+import abc
+import math
+import numpy
+from core import profile
+
+
+class NoiseFloorEstimator(object, metaclass=abc.ABCMeta):
+    def __init__(self):
+        self.count = 0
+
+    @abc.abstractmethod
+    def update(self, value):
+        pass
+
+    @property
+    @abc.abstractmethod
+    def mean(self):
+        pass
+
+    @property
+    @abc.abstractmethod
+    def stddev(self):
+        pass
+
+
+class HistogramEstimator(NoiseFloorEstimator):
+    def __init__(self, minimum=-200, maximum=200, limit=100):
+        """
+        Arguments:
+            minimum, maximum -- the range of the histogram, values outside
+                                of it are clamped to the nearest bin
+            limit -- halve the counts once there are more than this many
+        """
+        super(HistogramEstimator, self).__init__()
+        self._minimum = minimum
+        self._maximum = maximum
+        self._limit = limit
+        self._values = numpy.arange(minimum, maximum + 1, dtype=numpy.float64)
+        self._histogram = numpy.zeros(len(self._values))
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    def update(self, value):
+        if self.count > self._limit:
+            # Rescale, allowing changes in the environment to be
+            # recognized more quickly.
+            self._histogram = numpy.where(
+                self._histogram > 1,
+                (self._histogram + 1) / 2,
+                0
+            )
+            self.count = self._histogram.sum()
+            self._sum = numpy.dot(self._histogram, self._values)
+            self._sumsq = numpy.dot(self._histogram, self._values ** 2)
+        value = min(max(round(value), self._minimum), self._maximum)
+        self._histogram[value - self._minimum] += 1
+        self.count += 1
+        self._sum += value
+        self._sumsq += value ** 2
+
+    @property
+    def mean(self):
+        return self._sum / self.count if self.count else 0.0
+
+    @property
+    def stddev(self):
+        if self.count < 2:
+            return 0.0
+        mean = self.mean
+        variance = (self._sumsq - (self.count * (mean ** 2))) / (self.count - 1)
+        return math.sqrt(max(variance, 0))
+
+
+class EMAEstimator(NoiseFloorEstimator):
+    def __init__(self, alpha=0.01):
+        """
+        Arguments:
+            alpha -- the weight of each new value. Until 1/alpha values
+                     have been seen, every value counts equally.
+        """
+        super(EMAEstimator, self).__init__()
+        self._alpha = alpha
+        self._mean = 0.0
+        self._variance = 0.0
+
+    def update(self, value):
+        self.count += 1
+        alpha = max(self._alpha, 1.0 / self.count)
+        delta = value - self._mean
+        self._mean += alpha * delta
+        self._variance = (1 - alpha) * (self._variance + alpha * delta ** 2)
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @property
+    def stddev(self):
+        return math.sqrt(self._variance)
+
+
+ESTIMATORS = {
+    'histogram': HistogramEstimator,
+    'ema': EMAEstimator
+}
+
+
+def get_estimator(chunktime, name=None):
+    """
+    Creates the noise floor estimator configured in the profile.
+
+    Arguments:
+        chunktime -- the length of a frame in seconds, used to turn the
+                     time constants in the profile into frame counts
+        name -- (optional) the estimator to use instead of the one in
+                the profile
+
+    Returns:
+        A NoiseFloorEstimator
+    """
+    if name is None:
+        name = profile.get(['noise_floor', 'estimator'], 'ema')
+    if name not in ESTIMATORS:
+        raise ValueError(
+            "Unknown noise floor estimator '{}', expected one of {}".format(
+                name,
+                ", ".join(sorted(ESTIMATORS))
+            )
+        )
+    if name == 'ema':
+        time_constant = float(profile.get(['noise_floor', 'time_constant'], 3))
+        return EMAEstimator(alpha=min(1.0, chunktime / time_constant))
+    return ESTIMATORS[name]()
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for working with raw PCM audio through NumPy.
+
+Fragments are signed little-endian PCM as delivered by the audio engines
+and written by the wave module.
+"""
+import math
+import numpy
+import struct
+
+
+SAMPLE_DTYPES = {1: '<i1', 2: '<i2', 4: '<i4'}
+
+# Number of chunks converted to floating point at a time by chunk_rms, so
+# very long files do not need a float copy of the whole recording.
+RMS_BLOCK_CHUNKS = 4096
+
+
+def samples(fragment, width):
+    """
+    Returns:
+        The samples in fragment as a NumPy array. For 8, 16 and 32 bit
+        audio this is a view of the fragment, 24 bit audio is unpacked
+        into a new int32 array.
+    """
+    if width == 3:
+        data = numpy.frombuffer(fragment, dtype=numpy.uint8)
+        data = data[:len(data) - len(data) % 3].reshape(-1, 3)
+        return (
+            data[:, 0].astype(numpy.int32)
+            | (data[:, 1].astype(numpy.int32) << 8)
+            | (data[:, 2].astype(numpy.int8).astype(numpy.int32) << 16)
+        )
+    return numpy.frombuffer(
+        fragment,
+        dtype=SAMPLE_DTYPES[width],
+        count=len(fragment) // width
+    )
+
+
+def to_bytes(data, width):
+    """
+    Packs an integer array of samples into PCM audio, the reverse of
+    samples(). The values must already be in range for the width.
+
+    Returns:
+        bytes
+    """
+    if width == 3:
+        data = data.astype('<i4').view(numpy.uint8).reshape(-1, 4)
+        return data[:, :3].tobytes()
+    return data.astype(SAMPLE_DTYPES[width]).tobytes()
+
+
+# Root mean square of a fragment of PCM samples.
+# Replaces audioop.rms(), which is not available in Python 3.13, and
+# truncates the result to an int just like audioop did.
+def rms(fragment, width):
+    data = samples(fragment, width)
+    if len(data) == 0:
+        return 0
+    data = data.astype(numpy.float64)
+    return int(math.sqrt(numpy.dot(data, data) / len(data)))
+
+
+def chunk_rms(data, chunklength, channels=1):
+    """
+    Calculates the root mean square of every complete chunk of samples,
+    matching what Frame.level() returns for each chunk on its own.
+
+    Arguments:
+        data -- a one dimensional array of interleaved samples
+        chunklength -- the number of samples in a chunk (all channels)
+        channels -- (optional) the number of interleaved channels
+                    (Default: 1)
+
+    Returns:
+        An int64 array with one value per chunk, the level of the loudest
+        channel. A trailing partial chunk is ignored.
+    """
+    count = len(data) // chunklength
+    frames = chunklength // channels
+    # View the samples as a (chunk, frame, channel) array without copying
+    chunks = numpy.lib.stride_tricks.as_strided(
+        data,
+        shape=(count, frames, channels),
+        strides=(
+            data.strides[0] * chunklength,
+            data.strides[0] * channels,
+            data.strides[0]
+        ),
+        writeable=False
+    )
+    levels = numpy.empty(count, dtype=numpy.int64)
+    for start in range(0, count, RMS_BLOCK_CHUNKS):
+        block = chunks[start:start + RMS_BLOCK_CHUNKS].astype(numpy.float64)
+        levels[start:start + len(block)] = numpy.sqrt(
+            numpy.einsum('ijk,ijk->ik', block, block) / frames
+        ).max(axis=1)
+    return levels
+
+
+class Frame(object):
+    """
+    A chunk of interleaved PCM audio with any number of channels.
+
+    The samples are viewed as a (frames, channels) array, so a single
+    channel is a strided view of the original buffer rather than a copy
+    (24 bit audio is the exception, it has to be unpacked first).
+    """
+
+    def __init__(self, data, width, channels=1):
+        """
+        Arguments:
+            data -- a bytes-like object containing PCM audio
+            width -- the sample width in bytes
+            channels -- (optional) the number of interleaved channels
+                        (Default: 1)
+        """
+        self.data = data
+        self.width = width
+        self.channels = channels
+        interleaved = samples(data, width)
+        interleaved = interleaved[:len(interleaved) - len(interleaved) % channels]
+        self._samples = interleaved.reshape(-1, channels)
+
+    def __len__(self):
+        return len(self._samples)
+
+    @property
+    def samples(self):
+        """
+        Returns:
+            A (frames, channels) array of samples
+        """
+        return self._samples
+
+    def channel(self, index):
+        return self._samples[:, index]
+
+    def rms(self):
+        """
+        Returns:
+            An int64 array with the root mean square of every channel,
+            truncated like rms()
+        """
+        if len(self._samples) == 0:
+            return numpy.zeros(self.channels, dtype=numpy.int64)
+        data = self._samples.astype(numpy.float64)
+        return numpy.sqrt(
+            numpy.einsum('ij,ij->j', data, data) / len(data)
+        ).astype(numpy.int64)
+
+    def level(self):
+        """
+        Returns:
+            The root mean square of the loudest channel. For mono audio
+            this is the same as rms().
+        """
+        return int(self.rms().max())
+
+    def downmix(self):
+        """
+        Averages the channels into 16 bit mono audio, which is the only
+        format webrtcvad accepts.
+
+        Returns:
+            bytes
+        """
+        data = self._samples
+        if self.channels == 1:
+            mono = data[:, 0]
+        else:
+            mono = data.sum(axis=1, dtype=numpy.int64) // self.channels
+        # Scale to 16 bits
+        shift = 8 * (self.width - 2)
+        if shift > 0:
+            mono = mono >> shift
+        elif shift < 0:
+            mono = mono.astype(numpy.int32) << -shift
+        return mono.astype('<i2').tobytes()
+
+
+def snr(fragment, width, chunklength, channels=1):
+    """
+    Estimates the signal to noise ratio of a recording by comparing its
+    loud chunks with its quiet ones. Utterances from the voice activity
+    detector begin and end with some silence, which is what the speech
+    is compared against.
+
+    Arguments:
+        fragment -- PCM audio
+        width -- the sample width in bytes
+        chunklength -- the number of samples in a chunk (all channels)
+        channels -- (optional) the number of interleaved channels
+                    (Default: 1)
+
+    Returns:
+        The ratio in decibels, 0.0 if the fragment is shorter than a chunk
+    """
+    levels = chunk_rms(samples(fragment, width), chunklength, channels)
+    if len(levels) == 0:
+        return 0.0
+    noise = max(numpy.percentile(levels, 10), 1)
+    signal = max(numpy.percentile(levels, 90), 1)
+    return 20 * math.log10(signal / noise)
+
+
+def wav_data_offset(fp):
+    """
+    Finds the PCM data of a RIFF/WAVE file, which is not always at
+    byte 44 (extensible headers, LIST chunks and so on).
+
+    Arguments:
+        fp -- a file object opened in binary mode
+
+    Returns:
+        A tuple of the offset and the length (in bytes) of the data chunk
+    """
+    fp.seek(0)
+    riff, _, wave_id = struct.unpack('<4sI4s', fp.read(12))
+    if riff != b'RIFF' or wave_id != b'WAVE':
+        raise ValueError("Not a RIFF/WAVE file")
+    while True:
+        header = fp.read(8)
+        if len(header) < 8:
+            raise ValueError("WAVE file has no data chunk")
+        chunk_id, size = struct.unpack('<4sI', header)
+        if chunk_id == b'data':
+            return (fp.tell(), size)
+        # chunks are padded to an even number of bytes
+        fp.seek(size + (size & 1), 1)
@@ -3,6 +3,8 @@ import abc
 import collections
 import logging
 import mad
+import numpy
+import os
 import re
 import tempfile
 import wave
@@ -10,7 +12,9 @@ from core import audioengine
 from core import commandline
 from core import i18n
 from core import paths
+from core import pcm
 from core import profile
+from core import ringbuffer
 from core import vocabcompiler
 from jiwer import wer
 
@@ -99,7 +103,9 @@ class STTPlugin(GenericPlugin, metaclass=abc.ABCMeta):
         self._samplerate = 16000
         self._volume_normalization = None
 
-    def compile_vocabulary(self, compilation_func):
+    # With incremental=True, compilation_func is also given the changes
+    # since the last compilation (see VocabularyCompiler.compile)
+    def compile_vocabulary(self, compilation_func, incremental=False):
         if self._vocabulary_compiled:
             raise RuntimeError("Vocabulary has already been compiled!")
 
@@ -114,7 +120,8 @@ class STTPlugin(GenericPlugin, metaclass=abc.ABCMeta):
         if not vocabulary.matches_phrases(self._vocabulary_phrases):
             vocabulary.compile(
                 compilation_func,
-                self._vocabulary_phrases
+                self._vocabulary_phrases,
+                incremental=incremental
             )
 
         self._vocabulary_path = vocabulary.path
@@ -128,6 +135,83 @@ class STTPlugin(GenericPlugin, metaclass=abc.ABCMeta):
     def transcribe(self, fp):
         pass
 
+    # Set to True by plugins whose transcribe_pcm() can be called from
+    # several STT workers at the same time. Calls to other plugins are
+    # made one at a time.
+    thread_safe = False
+
+    # Streaming recognition. Plugins that can decode audio while it is
+    # still being recorded also inherit from STTStreamingMixin, which sets
+    # supports_streaming. Mic only streams to plugins that support it.
+    supports_streaming = False
+
+    def transcribe_pcm(self, buffer, rate, width, channels):
+        """
+        Performs STT on raw PCM audio held in memory.
+
+        Plugins that can work on the audio directly should override this.
+        By default the audio is wrapped in an in-memory WAV file and
+        passed to transcribe().
+
+        Arguments:
+            buffer -- a bytes-like object (bytes, bytearray, memoryview)
+                      containing the PCM data
+            rate -- the sample rate in Hz
+            width -- the sample width in bytes
+            channels -- the number of interleaved channels
+        """
+        with tempfile.SpooledTemporaryFile() as f:
+            wav = wave.open(f, mode='wb')
+            wav.setframerate(rate)
+            wav.setnchannels(channels)
+            wav.setsampwidth(width)
+            wav.writeframes(buffer)
+            wav.close()
+            f.seek(0)
+            return self.transcribe(f)
+
+
+class STTStreamingMixin(object, metaclass=abc.ABCMeta):
+    """
+    Streaming recognition for STT plugins, used as
+    class MyPlugin(plugin.STTStreamingMixin, plugin.STTPlugin).
+    """
+    supports_streaming = True
+
+    @abc.abstractmethod
+    def start_stream(self, rate, width, channels):
+        """
+        Starts decoding a new utterance.
+        """
+        pass
+
+    @abc.abstractmethod
+    def feed_stream(self, buffer):
+        """
+        Adds audio to the current utterance.
+
+        Returns:
+            The partial transcription so far (may be empty)
+        """
+        pass
+
+    @abc.abstractmethod
+    def end_stream(self):
+        """
+        Finishes the current utterance.
+
+        Returns:
+            The transcription, in the same form as transcribe()
+        """
+        pass
+
+    @abc.abstractmethod
+    def cancel_stream(self):
+        """
+        Throws away the current utterance.
+        """
+        pass
+
 
 class TTSPlugin(GenericPlugin, metaclass=abc.ABCMeta):
     """
@@ -160,83 +244,268 @@ class VADPlugin(GenericPlugin):
     # and after last voice detected
     # minimum capture is minimum audio to capture, minus the padding
     # at the front and end
-    def __init__(self, input_device, timeout=1, minimum_capture=0.5):
+    # maximum capture is the longest utterance (in seconds) that fits
+    # in the capture buffer
+    # frame size is the number of samples the detector looks at at once.
+    # The audio from the device is cut into frames of exactly that size,
+    # whatever size the device actually delivers (Default: the input
+    # chunksize)
+    def __init__(
+        self,
+        input_device,
+        timeout=1,
+        minimum_capture=0.5,
+        maximum_capture=None,
+        frame_size=None
+    ):
         self._logger = logging.getLogger(__name__)
         # input device
         self._input_device = input_device
+        if frame_size is None:
+            frame_size = input_device._input_chunksize
+        self._chunksize = int(frame_size)
         # Here is the number of frames that have to pass without
         # detecing a voice before we respond
-        chunklength = input_device._input_chunksize / input_device._input_rate
+        chunklength = self._chunksize / input_device._input_rate
         self._timeout = round(timeout / chunklength)
         # Mimimum capture frames is the smallest number of frames that will
         # be recognized as audio.
         self._minimum_capture = round((timeout + minimum_capture) / chunklength)
-        ct = input_device._input_chunksize / input_device._input_rate
-        self._chunktime = ct
+        self._chunktime = chunklength
+        if maximum_capture is None:
+            maximum_capture = profile.get(['audio', 'maximum_capture'], 30)
+        # Maximum capture frames is the largest number of frames in one
+        # recording, including the padding at the front.
+        self._maximum_capture = self._timeout + round(
+            maximum_capture / chunklength
+        )
+        # Preallocate the capture buffer. It holds the pre-roll plus the
+        # longest utterance we are willing to record.
+        framesize = int(
+            self._chunksize
+            * (input_device._input_bits / 8)
+            * input_device._input_channels
+        )
+        self._buffer = ringbuffer.RingBuffer(
+            framesize * self._maximum_capture,
+            preroll=framesize * self._timeout
+        )
+        self._reframer = ringbuffer.Reframer(framesize)
 
     # Override the _voice_detected method with your own method for
     # detecting whether a voice is detected or not. Return True if
     # you detect a voice, otherwise False.
+    # The "recording" keyword argument tells you if an utterance is
+    # currently being recorded. When the audio is scanned by
+    # segment_file(), the root mean square of the frame has already been
+    # calculated and is passed in the "rms" keyword argument.
     def _voice_detected(self, *args, **kwargs):
         pass
 
-    def get_audio(self):
-        frames = collections.deque([], 30)
+    # Runs the voice detector over a sequence of frames and yields an
+    # (event, index) tuple whenever the state of the recording changes:
+    #   "start" - voice detected, the utterance starts at frame index
+    #             (the pre-roll frames are included)
+    #   "discard" - the utterance ended at frame index (exclusive) but
+    #               was shorter than the minimum capture
+    #   "end" - the utterance ended at frame index (exclusive)
+    # levels is an optional sequence with the rms of each frame.
+    def _detect_utterances(self, frames, levels=None):
         last_voice_frame = 0
         recording = False
-        recording_frames = []
-        self._logger.info("Waiting for voice data")
-        for frame in self._input_device.record(
+        recorded_frames = 0
+        for index, frame in enumerate(frames):
+            if levels is None:
+                voice_detected = self._voice_detected(
+                    frame,
+                    recording=recording
+                )
+            else:
+                voice_detected = self._voice_detected(
+                    frame,
+                    recording=recording,
+                    rms=levels[index]
+                )
+            if not recording:
+                # Count the frames currently held as pre-roll
+                recorded_frames = min(recorded_frames + 1, self._timeout)
+                if(voice_detected):
+                    # Voice activity detected, start recording and
+                    # include the previous timeout frames.
+                    recording = True
+                    last_voice_frame = recorded_frames
+                    yield ("start", index + 1 - recorded_frames)
+            else:
+                # We're recording
+                recorded_frames += 1
+                if(voice_detected):
+                    last_voice_frame = recorded_frames
+                if(recorded_frames >= self._maximum_capture):
+                    self._logger.warning(
+                        "Recording reached maximum of {:d} frames".format(
+                            self._maximum_capture
+                        )
+                    )
+                    recording = False
+                    recorded_frames = 0
+                    yield ("end", index + 1)
+                elif(last_voice_frame < recorded_frames - self._timeout):
+                    # We have waited past the timeout number of frames
+                    # so we believe the speaker has finished speaking.
+                    recording = False
+                    if(recorded_frames < self._minimum_capture):
+                        self._logger.debug(
+                            " ".join([
+                                "Recorded {:d} frames, less than threshold",
+                                "of {:d} frames ({:.2f} seconds). Discarding"
+                            ]).format(
+                                recorded_frames,
+                                self._minimum_capture,
+                                recorded_frames * self._chunktime
+                            )
+                        )
+                        recorded_frames = min(recorded_frames, self._timeout)
+                        yield ("discard", index + 1)
+                    else:
+                        self._logger.debug(
+                            "Recorded {:d} frames".format(recorded_frames)
+                        )
+                        recorded_frames = 0
+                        yield ("end", index + 1)
+
+    # Reads from the input device and cuts the audio into frames of
+    # self._chunksize samples, copying each one into the capture buffer
+    # before it is passed on to the voice detector.
+    # While an utterance is being recorded, the frames are also passed to
+    # the stream, if there is one.
+    def _capture(self, stream=None):
+        self._reframer.clear()
+        for data in self._input_device.record(
             self._input_device._input_chunksize,
             self._input_device._input_bits,
             self._input_device._input_channels,
             self._input_device._input_rate
         ):
-            frames.append(frame)
             if(profile.get_arg('resetmic', False)):
-                return recording_frames
-            else:
-                voice_detected = self._voice_detected(frame, recording=recording)
-                if not recording:
-                    if(voice_detected):
-                        # Voice activity detected, start recording and use
-                        # the last 10 frames to start
-                        self._logger.debug(
-                            "Started recording on device '{:s}'".format(
-                                self._input_device.slug
-                            )
+                return
+            for frame in self._reframer.frames(data):
+                self._buffer.write(frame)
+                if stream is not None and self._buffer.marked:
+                    stream.feed_stream(frame)
+                yield frame
+
+    # Returns the recorded utterance as a bytes object containing the raw
+    # PCM data (pre-roll included), or an empty bytes object if the
+    # microphone is being reset.
+    # If a stream is passed in, it receives the utterance while it is
+    # being recorded: start_stream() with the pre-roll when a voice is
+    # detected, feed_stream() with every frame after that, then either
+    # end_stream() or cancel_stream() (if the recording was too short).
+    def get_audio(self, stream=None):
+        audio = self._buffer
+        audio.clear()
+        self._logger.info("Waiting for voice data")
+        try:
+            for event, index in self._detect_utterances(
+                self._capture(stream)
+            ):
+                if event == "start":
+                    self._logger.debug(
+                        "Started recording on device '{:s}'".format(
+                            self._input_device.slug
                         )
-                        recording = True
-                        # Include the previous 10 frames in the recording.
-                        recording_frames = list(frames)[-self._timeout:]
-                        last_voice_frame = len(recording_frames)
+                    )
+                    audio.mark()
+                    if stream is not None:
+                        stream.start_stream(audio.getvalue())
+                elif event == "discard":
+                    audio.release()
+                    if stream is not None:
+                        stream.cancel_stream()
                 else:
-                    # We're recording
-                    recording_frames.append(frame)
-                    if(voice_detected):
-                        last_voice_frame = len(recording_frames)
-                    if(last_voice_frame < len(recording_frames) - self._timeout):
-                        # We have waited past the timeout number of frames
-                        # so we believe the speaker has finished speaking.
-                        recording = False
-                        if(len(recording_frames) < self._minimum_capture):
-                            self._logger.debug(
-                                " ".join([
-                                    "Recorded {:d} frames, less than threshold",
-                                    "of {:d} frames ({:.2f} seconds). Discarding"
-                                ]).format(
-                                    len(recording_frames),
-                                    self._minimum_capture,
-                                    len(recording_frames) * self._chunktime
-                                )
-                            )
-                        else:
-                            self._logger.debug(
-                                "Recorded {:d} frames".format(
-                                    len(recording_frames)
-                                )
-                            )
-                            return recording_frames
+                    if stream is not None:
+                        stream.end_stream()
+                    # Copy once here, the capture thread keeps
+                    # writing into the buffer while STT runs.
+                    return audio.getvalue()
+        except ringbuffer.BufferFull:
+            self._logger.warning("Recording buffer full, stopping")
+            if stream is not None:
+                stream.end_stream()
+            return audio.getvalue()
+        if stream is not None and audio.marked:
+            stream.cancel_stream()
+        return b''
+
+    def segment_file(self, path):
+        """
+        Runs the voice detector over a recorded WAV file, the same way
+        get_audio() would if the file was coming from the input device.
+        The file is memory mapped and the rms of every chunk is
+        calculated in one pass before the chunks are classified.
+
+        Arguments:
+            path -- the path of a WAV file in the input device's format
+
+        Returns:
+            A list of (start, end) tuples with the position (in sample
+            frames) of every utterance get_audio() would return
+        """
+        chunksize = self._chunksize
+        width = int(self._input_device._input_bits / 8)
+        channels = self._input_device._input_channels
+        rate = self._input_device._input_rate
+        with open(path, 'rb') as f:
+            with wave.open(f, 'rb') as w:
+                file_format = (w.getsampwidth(), w.getnchannels(), w.getframerate())
+            if file_format != (width, channels, rate):
+                raise audioengine.UnsupportedFormat(
+                    " ".join([
+                        "'{}' is {}-bit, {}-channel at {} Hz but the input",
+                        "device is configured for {}-bit, {}-channel at {} Hz"
+                    ]).format(
+                        path,
+                        file_format[0] * 8,
+                        file_format[1],
+                        file_format[2],
+                        width * 8,
+                        channels,
+                        rate
+                    )
+                )
+            offset, length = pcm.wav_data_offset(f)
+            filesize = os.fstat(f.fileno()).st_size
+        # The data chunk length is not always filled in by programs
+        # that stream to a file
+        if length in (0, 0xFFFFFFFF) or offset + length > filesize:
+            length = filesize - offset
+        framesize = chunksize * width * channels
+        segments = []
+        if length < framesize:
+            return segments
+        data = numpy.memmap(
+            path,
+            dtype=numpy.uint8,
+            mode='r',
+            offset=offset,
+            shape=(length,)
+        )
+        levels = pcm.chunk_rms(
+            pcm.samples(data, width),
+            chunksize * channels,
+            channels
+        )
+        frames = (
+            data[i * framesize:(i + 1) * framesize]
+            for i in range(len(levels))
+        )
+        start = None
+        for event, index in self._detect_utterances(frames, levels):
+            if event == "start":
+                start = index
+            elif event == "end":
+                segments.append((start * chunksize, index * chunksize))
+        return segments
 
 
 class STTTrainerPlugin(GenericPlugin):
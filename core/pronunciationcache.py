@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of the pronunciations predicted by Phonetisaurus.
+
+Almost every word in a vocabulary is the same as in the previous
+revision, so the pronunciations are kept in a SQLite database keyed by
+(FST model hash, nbest, alphabet, word). Only the words that are not in
+the cache yet are sent to G2P.
+
+The model is identified by the SHA1 of its contents, so a retrained
+model never returns stale pronunciations. Words Phonetisaurus has no
+pronunciation for are cached too, so they are not asked for again.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from core import paths
+from core import profile
+
+
+# SQLite limits the number of parameters in a query
+BATCH_SIZE = 500
+
+_model_hashes = {}
+_lock = threading.Lock()
+
+
+def model_hash(fst_model):
+    """
+    Returns the SHA1 of the FST model file. The hash is only computed
+    again when the file changes.
+    """
+    path = os.path.realpath(fst_model)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime, stat.st_size)
+    with _lock:
+        if key in _model_hashes:
+            return _model_hashes[key]
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    with _lock:
+        _model_hashes[key] = sha1.hexdigest()
+    return _model_hashes[key]
+
+
+def get_cache():
+    """
+    Returns the pronunciation cache configured in the profile, or None
+    if g2p: cache: is turned off.
+    """
+    if not profile.get_profile_flag(['g2p', 'cache'], True):
+        return None
+    return PronunciationCache(
+        profile.get(
+            ['g2p', 'cache_file'],
+            paths.sub('cache', 'pronunciations.db')
+        )
+    )
+
+
+class PronunciationCache(object):
+    def __init__(self, path):
+        self._logger = logging.getLogger(__name__)
+        self.path = path
+        self._created = False
+
+    def _connect(self):
+        # A connection per call keeps the cache safe to use from several
+        # threads and processes at once
+        if not self._created:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._created:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS pronunciations ("
+                    "model TEXT NOT NULL, "
+                    "nbest INTEGER NOT NULL, "
+                    "alphabet TEXT NOT NULL, "
+                    "word TEXT NOT NULL, "
+                    "pronunciations TEXT NOT NULL, "
+                    "PRIMARY KEY (model, nbest, alphabet, word))"
+                )
+            self._created = True
+        return connection
+
+    def get(self, model, nbest, alphabet, words):
+        """
+        Returns:
+            A dictionary of word: [pronunciation, ...] for every word found
+            in the cache. Words cached without a pronunciation map to an
+            empty list.
+        """
+        result = {}
+        words = list(words)
+        connection = self._connect()
+        try:
+            for start in range(0, len(words), BATCH_SIZE):
+                batch = words[start:start + BATCH_SIZE]
+                rows = connection.execute(
+                    "SELECT word, pronunciations FROM pronunciations "
+                    "WHERE model = ? AND nbest = ? AND alphabet = ? "
+                    "AND word IN ({})".format(", ".join("?" * len(batch))),
+                    [model, nbest or 0, alphabet] + batch
+                )
+                for word, pronunciations in rows:
+                    result[word] = json.loads(pronunciations)
+        finally:
+            connection.close()
+        return result
+
+    def put(self, model, nbest, alphabet, pronunciations):
+        """
+        Stores a dictionary of word: [pronunciation, ...].
+        """
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO pronunciations "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            model,
+                            nbest or 0,
+                            alphabet,
+                            word,
+                            json.dumps(values)
+                        )
+                        for word, values in pronunciations.items()
+                    ]
+                )
+        finally:
+            connection.close()
+
+    def translate(self, fst_model, nbest, alphabet, words, translate):
+        """
+        Looks the words up in the cache and only passes the missing ones to
+        translate.
+
+        Arguments:
+            fst_model -- the path of the FST model
+            nbest -- the number of pronunciations per word
+            alphabet -- the alphabet of the pronunciations
+            words -- a list of words
+            translate -- a function taking a list of words and returning a
+                         dictionary of word: [pronunciation, ...]
+
+        Returns:
+            A dictionary of word: [pronunciation, ...], the same as
+            translate(words) would.
+        """
+        words = list(dict.fromkeys(words))
+        try:
+            model = model_hash(fst_model)
+        except OSError:
+            # Without the model there is nothing to key the cache on, the
+            # translate function will report the problem
+            return translate(words)
+        cached = self.get(model, nbest, alphabet, words)
+        missing = [word for word in words if word not in cached]
+        self._logger.debug(
+            "{} of {} pronunciations cached".format(
+                len(words) - len(missing),
+                len(words)
+            )
+        )
+        if missing:
+            predicted = translate(missing)
+            self.put(
+                model,
+                nbest,
+                alphabet,
+                {word: predicted.get(word, []) for word in missing}
+            )
+            cached.update(predicted)
+        return {
+            word: cached[word] for word in words if cached.get(word)
+        }
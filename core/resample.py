@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming sample rate conversion.
+
+Lets the microphone run at whatever rate the device supports (44.1 or
+48 kHz on many USB devices) while the speech to text engine gets audio
+at the rate of its model.
+
+The conversion is a polyphase FIR filter: conceptually the input is
+upsampled by "up", low-pass filtered and downsampled by "down", but only
+the filter taps that line up with an output sample are ever evaluated.
+Audio is converted one chunk at a time. The only state carried between
+chunks is the last few input samples, so the added latency is half the
+filter length (about 1 ms at 16 kHz).
+"""
+import math
+import numpy
+from core import pcm
+
+
+# Zero crossings of the sinc on each side of the centre of the filter
+ZERO_CROSSINGS = 16
+# Shape of the Kaiser window, about 80 dB of stop band attenuation
+KAISER_BETA = 8.0
+# Pass band edge as a fraction of the lower Nyquist frequency
+ROLLOFF = 0.9
+
+
+class Resampler(object):
+    def __init__(
+        self,
+        from_rate,
+        to_rate,
+        width=2,
+        channels=1,
+        zero_crossings=ZERO_CROSSINGS
+    ):
+        """
+        Arguments:
+            from_rate -- the sample rate of the input in Hz
+            to_rate -- the sample rate of the output in Hz
+            width -- (optional) the sample width in bytes, 1, 2, 3 or 4
+                     (Default: 2)
+            channels -- (optional) the number of interleaved channels
+                        (Default: 1)
+            zero_crossings -- (optional) the length of the filter, longer
+                              is sharper but slower
+        """
+        if width not in (1, 2, 3, 4):
+            raise ValueError(
+                "Can not resample {} bit audio".format(width * 8)
+            )
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self._width = width
+        self._channels = channels
+        # 24 bit samples are unpacked into int32 by pcm.samples()
+        bits = width * 8
+        self._min = -(1 << (bits - 1))
+        self._max = (1 << (bits - 1)) - 1
+        divisor = math.gcd(from_rate, to_rate)
+        self._up = to_rate // divisor
+        self._down = from_rate // divisor
+        factor = max(self._up, self._down)
+        # Taps per phase
+        self._taps = int(math.ceil(2 * zero_crossings * factor / self._up))
+        length = self._taps * self._up
+        # Windowed sinc low-pass filter at the upsampled rate
+        cutoff = ROLLOFF * 0.5 / factor
+        t = numpy.arange(length) - (length - 1) / 2
+        prototype = numpy.sinc(2 * cutoff * t) * numpy.kaiser(
+            length,
+            KAISER_BETA
+        )
+        prototype *= self._up / prototype.sum()
+        # bank[phase] holds the taps used for outputs that fall on that
+        # phase, reversed so they can be multiplied with a slice of the
+        # input in order
+        self._bank = numpy.ascontiguousarray(
+            prototype.reshape(self._taps, self._up).T[:, ::-1]
+        )
+        self.reset()
+
+    def reset(self):
+        self._history = numpy.zeros(
+            (self._taps - 1, self._channels),
+            dtype=numpy.float64
+        )
+        # Position of the next output sample, in 1/up input samples,
+        # relative to the start of the next chunk
+        self._position = 0
+        self._input_frames = 0
+        self._output_frames = 0
+
+    def process(self, fragment):
+        """
+        Converts the next chunk of audio.
+
+        Arguments:
+            fragment -- PCM audio at from_rate
+
+        Returns:
+            bytes of PCM audio at to_rate. The number of frames returned
+            for each chunk varies by one or two as the phase moves on.
+        """
+        data = pcm.samples(fragment, self._width)
+        data = data[:len(data) - len(data) % self._channels]
+        frames = data.reshape(-1, self._channels)
+        count = len(frames)
+        buffer = numpy.concatenate((self._history, frames))
+        available = count * self._up - self._position
+        outputs = max(0, -(-available // self._down))
+        positions = self._position + self._down * numpy.arange(outputs)
+        # Every window of "taps" input samples, without copying
+        windows = numpy.lib.stride_tricks.as_strided(
+            buffer,
+            shape=(len(buffer) - self._taps + 1, self._taps, self._channels),
+            strides=(buffer.strides[0], buffer.strides[0], buffer.strides[1]),
+            writeable=False
+        )
+        result = numpy.einsum(
+            'ij,ijc->ic',
+            self._bank[positions % self._up],
+            windows[positions // self._up]
+        )
+        self._position += outputs * self._down - count * self._up
+        self._history = buffer[len(buffer) - self._taps + 1:].copy()
+        self._input_frames += count
+        self._output_frames += outputs
+        return pcm.to_bytes(
+            numpy.clip(numpy.rint(result), self._min, self._max),
+            self._width
+        )
+
+    def flush(self):
+        """
+        Returns the audio still held back by the filter and resets the
+        resampler for the next stream.
+        """
+        expected = self._input_frames * self._up // self._down
+        remaining = expected - self._output_frames
+        tail = b''
+        if remaining > 0:
+            tail = self.process(
+                bytes(self._taps * self._channels * self._width)
+            )
+            tail = tail[:remaining * self._channels * self._width]
+        self.reset()
+        return tail
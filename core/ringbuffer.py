@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Fixed-capacity PCM buffers used by the capture thread.
+
+All audio is written into a single bytearray that is allocated once, so
+the pre-roll kept while waiting for a voice and the utterance recorded
+afterwards are both slices of the same memory instead of lists of
+individual frames.
+
+The Reframer cuts whatever the audio device delivers into frames of
+exactly the size the voice activity detector works with.
+"""
+
+
+class BufferFull(Exception):
+    pass
+
+
+class RingBuffer(object):
+    """
+    While no utterance is marked the buffer behaves like a ring, keeping
+    only the most recent "preroll" bytes. Once mark() is called the
+    retained pre-roll is moved to the front of the buffer and every
+    following write is appended after it, so the whole utterance is
+    always one contiguous region that can be returned as a memoryview.
+    """
+
+    def __init__(self, capacity, preroll=0):
+        """
+        Arguments:
+            capacity -- the size of the buffer in bytes
+            preroll -- (optional) the number of bytes to keep while no
+                       utterance is marked (Default: 0)
+        """
+        if preroll > capacity:
+            raise ValueError(
+                "Pre-roll of {} bytes does not fit in a {} byte buffer".format(
+                    preroll,
+                    capacity
+                )
+            )
+        self._capacity = capacity
+        self._preroll = preroll
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self._marked = False
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def marked(self):
+        return self._marked
+
+    @property
+    def free(self):
+        """
+        Returns:
+            The number of bytes that can still be written before the
+            buffer has to drop data (or raise BufferFull when marked)
+        """
+        if self._marked:
+            return self._capacity - self._end
+        return self._capacity - len(self)
+
+    def _compact(self):
+        # memoryview slice assignment uses memmove, so the overlapping
+        # source and destination regions are safe and nothing is allocated
+        length = len(self)
+        if self._start > 0:
+            self._view[0:length] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = length
+
+    def write(self, frame):
+        """
+        Copies a frame of audio into the buffer.
+
+        Arguments:
+            frame -- a bytes-like object containing PCM data
+
+        Raises BufferFull if an utterance is marked and the frame does
+        not fit in the remaining space.
+        """
+        size = len(frame)
+        if self._marked:
+            if size > self._capacity - self._end:
+                raise BufferFull(
+                    "Recording exceeds buffer capacity of {} bytes".format(
+                        self._capacity
+                    )
+                )
+        else:
+            if size >= self._capacity:
+                # Only the tail of the frame can be kept
+                frame = memoryview(frame)[size - self._capacity:]
+                size = self._capacity
+                self._start = self._end = 0
+            elif size > self._capacity - self._end:
+                self._start = max(self._start, self._end + size - self._capacity)
+                self._compact()
+        self._view[self._end:self._end + size] = frame
+        self._end += size
+        if not self._marked and len(self) > self._preroll:
+            self._start = self._end - self._preroll
+
+    def mark(self):
+        """
+        Starts an utterance. The retained pre-roll becomes the beginning
+        of the utterance and subsequent writes are appended to it.
+        """
+        self._compact()
+        self._marked = True
+
+    def release(self):
+        """
+        Ends the current utterance without clearing it. Only the most
+        recent pre-roll is kept, as if mark() had never been called.
+        """
+        self._marked = False
+        if len(self) > self._preroll:
+            self._start = self._end - self._preroll
+
+    def getbuffer(self):
+        """
+        Returns:
+            A read-only memoryview of the buffered audio. The view points
+            into the buffer and is only valid until the next write or
+            clear().
+        """
+        return self._view[self._start:self._end].toreadonly()
+
+    def getvalue(self):
+        """
+        Returns:
+            A copy of the buffered audio as bytes, safe to hand to
+            another thread
+        """
+        return self._view[self._start:self._end].tobytes()
+
+    def clear(self):
+        self._start = 0
+        self._end = 0
+        self._marked = False
+
+
+class Reframer(object):
+    """
+    Splits a stream of arbitrarily sized reads into frames of exactly
+    framesize bytes. Bytes left over at the end of a read are carried
+    over and become the start of the next frame, so no audio is lost.
+    """
+
+    def __init__(self, framesize):
+        self._framesize = framesize
+        self._carry = bytearray(framesize)
+        self._view = memoryview(self._carry)
+        self._filled = 0
+
+    def __len__(self):
+        # Number of bytes waiting for the rest of their frame
+        return self._filled
+
+    def frames(self, data):
+        """
+        Yields every frame that can be completed with data, as bytes.
+        """
+        size = len(data)
+        if self._filled == 0 and size == self._framesize:
+            # The usual case, the device delivered exactly one frame
+            yield bytes(data)
+            return
+        data = memoryview(data)
+        offset = 0
+        if self._filled > 0:
+            offset = min(self._framesize - self._filled, size)
+            self._view[self._filled:self._filled + offset] = data[:offset]
+            self._filled += offset
+            if self._filled < self._framesize:
+                return
+            self._filled = 0
+            yield bytes(self._carry)
+        while size - offset >= self._framesize:
+            yield data[offset:offset + self._framesize].tobytes()
+            offset += self._framesize
+        if offset < size:
+            self._filled = size - offset
+            self._view[:self._filled] = data[offset:]
+
+    def clear(self):
+        self._filled = 0
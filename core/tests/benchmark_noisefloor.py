@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compares the noise floor estimators in core/noisefloor.py on recorded
+audio.
+
+Every WAV file is run through a voice activity detector once per
+estimator. For each run this prints how long the detector took per
+frame (average and worst case), how far the threshold moved between two
+frames, how many utterances were found, and how often the voice/silence
+decision matched the histogram estimator (the old behaviour).
+
+    python3 -m core.tests.benchmark_noisefloor [--vad snr_vad] [file.wav ...]
+"""
+import argparse
+import copy
+import time
+import wave
+from core import noisefloor
+from core import paths
+from core import pcm
+from core import profile
+from core import testutils
+
+
+def get_plugin_class(vad):
+    if vad == 'webrtc_vad':
+        from plugins.vad.webrtc_vad import webrtc_vad
+        return webrtc_vad.WebRTCPlugin
+    from plugins.vad.snr_vad import snr_vad
+    return snr_vad.SNRPlugin
+
+
+def run(plugin_class, path, estimator):
+    with wave.open(path, 'rb') as w:
+        rate = w.getframerate()
+        width = w.getsampwidth()
+        channels = w.getnchannels()
+        data = w.readframes(w.getnframes())
+    benchmark_profile = copy.deepcopy(testutils.test_profile())
+    benchmark_profile['audio'].update({
+        'input_samplerate': rate,
+        'input_samplewidth': width * 8,
+        'input_channels': channels,
+        'input_chunksize': int(rate * 0.03)
+    })
+    benchmark_profile['noise_floor'] = {'estimator': estimator}
+    profile.set_profile(benchmark_profile)
+    plugin = testutils.get_plugin_instance(
+        plugin_class,
+        testutils.TestInput(path)
+    )
+    framesize = plugin._chunksize * width * channels
+    levels = pcm.chunk_rms(
+        pcm.samples(data, width),
+        plugin._chunksize * channels,
+        channels
+    )
+    frames = [
+        data[i * framesize:(i + 1) * framesize] for i in range(len(levels))
+    ]
+    timings = []
+    thresholds = []
+    decisions = []
+    voice_detected = plugin._voice_detected
+
+    def timed_voice_detected(*args, **kwargs):
+        start = time.perf_counter()
+        response = voice_detected(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+        thresholds.append(plugin._stats.threshold)
+        decisions.append(response)
+        return response
+
+    plugin._voice_detected = timed_voice_detected
+    utterances = sum(
+        1 for event, index in plugin._detect_utterances(frames, levels)
+        if event == "end"
+    )
+    jumps = [
+        abs(thresholds[i] - thresholds[i - 1])
+        for i in range(2, len(thresholds))
+    ]
+    return {
+        'utterances': utterances,
+        'decisions': decisions,
+        'mean': sum(timings) / len(timings) if timings else 0,
+        'max': max(timings, default=0),
+        'jump': max(jumps, default=0),
+        'jumps': sum(1 for jump in jumps if jump > 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare noise floor estimators on recorded audio"
+    )
+    parser.add_argument(
+        '--vad',
+        default='snr_vad',
+        choices=['snr_vad', 'webrtc_vad']
+    )
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+    files = args.files or [paths.data('audio', 'time.wav')]
+    plugin_class = get_plugin_class(args.vad)
+    names = ['histogram'] + sorted(
+        name for name in noisefloor.ESTIMATORS if name != 'histogram'
+    )
+    print(
+        "{:<24} {:<10} {:>10} {:>9} {:>9} {:>9} {:>9} {:>7}".format(
+            "file",
+            "estimator",
+            "utterances",
+            "agree %",
+            "mean us",
+            "max us",
+            "max jump",
+            "jumps>3"
+        )
+    )
+    for path in files:
+        baseline = None
+        for name in names:
+            result = run(plugin_class, path, name)
+            if baseline is None:
+                baseline = result['decisions']
+            agree = sum(
+                1 for a, b in zip(baseline, result['decisions']) if a == b
+            ) * 100.0 / max(len(baseline), 1)
+            print(
+                "{:<24} {:<10} {:>10d} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.2f} {:>7d}".format(
+                    path[-24:],
+                    name,
+                    result['utterances'],
+                    agree,
+                    result['mean'] * 1e6,
+                    result['max'] * 1e6,
+                    result['jump'],
+                    result['jumps']
+                )
+            )
+
+
+if __name__ == '__main__':
+    main()
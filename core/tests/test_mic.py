@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+import time
+import unittest
+from core import mic
+from core import profile
+from core import testutils
+
+
+class FakeInputDevice(object):
+    _input_rate = 16000
+    _input_bits = 16
+    _input_channels = 1
+
+
+class FakeSTTPlugin(object):
+    _samplerate = 16000
+    thread_safe = False
+
+    def __init__(self):
+        self.calls = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self._lock = threading.Lock()
+
+    def transcribe_pcm(self, audio, rate, width, channels):
+        with self._lock:
+            self.calls += 1
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        # Later utterances often finish before earlier ones
+        time.sleep(random.uniform(0, 0.01))
+        with self._lock:
+            self.concurrent -= 1
+        return [audio.decode('ascii')]
+
+
+class TestMic(unittest.TestCase):
+    def setUp(self):
+        profile.set_profile(testutils.test_profile())
+        self.stt_plugin = FakeSTTPlugin()
+        self.mic = mic.Mic(
+            input_device=FakeInputDevice(),
+            active_stt_plugin=self.stt_plugin
+        )
+        self.transcriptions = []
+        self.mic.handle_transcription = self.transcriptions.append
+
+    def transcribe(self, count, workers=4):
+        self.mic.start_stt_workers(workers)
+        utterances = ["utterance {}".format(i) for i in range(count)]
+        for utterance in utterances:
+            self.mic.add_to_queue(utterance.encode('ascii'))
+        self.mic.stop_stt_workers()
+        return utterances
+
+    def test_workers_preserve_order(self):
+        utterances = self.transcribe(50)
+        self.assertEqual(self.transcriptions, utterances)
+
+    def test_stop_drains_queue(self):
+        utterances = self.transcribe(20, workers=2)
+        self.assertEqual(len(self.transcriptions), len(utterances))
+        self.assertEqual(self.mic.backlog, 0)
+        self.assertEqual(self.mic.stt_threads, [])
+
+    def test_plugins_not_thread_safe_are_serialized(self):
+        self.transcribe(20)
+        self.assertEqual(self.stt_plugin.max_concurrent, 1)
+
+    def test_thread_safe_plugins_run_concurrently(self):
+        self.stt_plugin.thread_safe = True
+        utterances = self.transcribe(50)
+        self.assertEqual(self.transcriptions, utterances)
+        self.assertGreater(self.stt_plugin.max_concurrent, 1)
+
+    def test_error_does_not_block_later_utterances(self):
+        transcribe_pcm = self.stt_plugin.transcribe_pcm
+
+        def fail_first(audio, *args):
+            if audio == b"utterance 0":
+                raise RuntimeError("decoder failed")
+            return transcribe_pcm(audio, *args)
+        self.stt_plugin.transcribe_pcm = fail_first
+        utterances = self.transcribe(10)
+        self.assertEqual(self.transcriptions, utterances[1:])
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import io
+import re
+import unittest
+from core import ngram
+
+
+SENTENCES = [
+    phrase.split() for phrase in [
+        "TURN ON THE LIGHT",
+        "TURN OFF THE LIGHT",
+        "TURN ON THE RADIO",
+        "WHAT TIME IS IT",
+        "WHAT IS THE WEATHER",
+        "WHAT IS THE TIME",
+        "TELL ME A JOKE",
+        "TELL ME THE TIME"
+    ]
+]
+
+
+class TestLanguageModel(unittest.TestCase):
+    def models(self):
+        for smoothing in ('witten_bell', 'good_turing'):
+            for order in (1, 2, 3):
+                yield ngram.LanguageModel(
+                    SENTENCES,
+                    order=order,
+                    smoothing=smoothing
+                )
+
+    def test_probabilities_sum_to_one(self):
+        for model in self.models():
+            # Everything but the sentence start can follow a context
+            vocabulary = [
+                word for (word,) in model.counts[1]
+                if word != ngram.SENTENCE_START
+            ]
+            contexts = [()]
+            for n in range(2, model.order + 1):
+                contexts.extend(model._contexts(n))
+            for context in contexts:
+                total = sum(
+                    model.probability(context + (word,))
+                    for word in vocabulary
+                )
+                self.assertAlmostEqual(
+                    total,
+                    1.0,
+                    places=9,
+                    msg="{} {}-gram context {}".format(
+                        model.smoothing,
+                        model.order,
+                        context
+                    )
+                )
+
+    def test_arpa_header_matches_sections(self):
+        for model in self.models():
+            f = io.StringIO()
+            model.write_arpa(f)
+            arpa = f.getvalue()
+            header = {
+                int(n): int(count)
+                for n, count in re.findall(r"^ngram (\d+)=(\d+)$", arpa, re.M)
+            }
+            self.assertEqual(sorted(header), list(range(1, model.order + 1)))
+            sections = re.split(r"^\\(\d+)-grams:$", arpa, flags=re.M)
+            self.assertTrue(sections[-1].rstrip().endswith("\\end\\"))
+            for n, body in zip(sections[1::2], sections[2::2]):
+                n = int(n)
+                lines = [
+                    line for line in body.splitlines()
+                    if line and line != "\\end\\"
+                ]
+                self.assertEqual(len(lines), header[n])
+                for line in lines:
+                    fields = line.split()
+                    # log probability, n words, optional backoff weight
+                    self.assertIn(len(fields), (n + 1, n + 2))
+                    if len(fields) == n + 2:
+                        self.assertLess(n, model.order)
+
+    def test_words(self):
+        model = ngram.LanguageModel(SENTENCES)
+        self.assertIn("TURN", model.words)
+        self.assertNotIn(ngram.SENTENCE_START, model.words)
+        self.assertNotIn(ngram.SENTENCE_END, model.words)
+        self.assertEqual(model.words, sorted(set(model.words)))
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy
+from core import pcm
+from core import resample
+
+
+class TestResampler(unittest.TestCase):
+    def tone(self, rate, amplitude, seconds=0.5):
+        t = numpy.arange(int(rate * seconds)) / rate
+        return numpy.rint(
+            numpy.sin(2 * numpy.pi * 440 * t) * amplitude
+        ).astype(numpy.int32)
+
+    def resample(self, samples, width, from_rate=48000, to_rate=16000):
+        resampler = resample.Resampler(from_rate, to_rate, width)
+        audio = pcm.to_bytes(samples, width)
+        return pcm.samples(
+            resampler.process(audio) + resampler.flush(),
+            width
+        )
+
+    def test_24_bit_matches_16_bit(self):
+        tone = self.tone(48000, 1 << 22)
+        converted_24 = self.resample(tone, 3)
+        converted_16 = self.resample(tone >> 8, 2)
+        self.assertEqual(len(converted_24), 8000)
+        self.assertEqual(len(converted_24), len(converted_16))
+        self.assertLessEqual(
+            numpy.abs((converted_24 >> 8) - converted_16).max(),
+            1
+        )
+
+    def test_24_bit_clips_to_range(self):
+        tone = self.tone(48000, (1 << 23) - 1)
+        converted = self.resample(tone, 3)
+        self.assertLessEqual(converted.max(), (1 << 23) - 1)
+        self.assertGreaterEqual(converted.min(), -(1 << 23))
+
+    def test_to_bytes_is_the_reverse_of_samples(self):
+        for width in (1, 2, 3, 4):
+            bits = width * 8
+            samples = numpy.array(
+                [-(1 << (bits - 1)), -1, 0, 1, (1 << (bits - 1)) - 1]
+            )
+            audio = pcm.to_bytes(samples, width)
+            self.assertEqual(len(audio), len(samples) * width)
+            numpy.testing.assert_array_equal(
+                pcm.samples(audio, width),
+                samples
+            )
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from core import vocabcompiler
+
+
+class TestVocabularyDiff(unittest.TestCase):
+    def test_diff(self):
+        diff = vocabcompiler.VocabularyDiff(
+            ["TURN ON THE LIGHT", "WHAT TIME IS IT"],
+            ["TURN ON THE LIGHT", "TURN OFF THE LIGHT"]
+        )
+        self.assertTrue(diff)
+        self.assertEqual(diff.added_phrases, ["TURN OFF THE LIGHT"])
+        self.assertEqual(diff.removed_phrases, ["WHAT TIME IS IT"])
+        # "the" is still used by the remaining phrases
+        self.assertEqual(diff.removed_words, ["is", "it", "time", "what"])
+
+    def test_no_changes(self):
+        diff = vocabcompiler.VocabularyDiff(["HELLO"], ["HELLO"])
+        self.assertFalse(diff)
+        self.assertEqual(diff.removed_words, [])
+
+    def test_words_ignore_case(self):
+        diff = vocabcompiler.VocabularyDiff(["Hello there"], ["HELLO"])
+        self.assertEqual(diff.removed_words, ["there"])
+
+
+class TestIncrementalCompile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.vocabulary = vocabcompiler.VocabularyCompiler(
+            'test',
+            path=self.directory
+        )
+        self.diffs = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compilation_func(self, path, phrases, diff=None):
+        self.diffs.append(diff)
+        with open(os.path.join(path, 'phrases'), 'w') as f:
+            f.write("\n".join(phrases))
+
+    def test_first_compile_has_no_diff(self):
+        self.vocabulary.compile(self.compilation_func, ["HELLO"], incremental=True)
+        self.assertEqual(self.diffs, [None])
+        self.assertEqual(self.vocabulary.compiled_phrases, ["HELLO"])
+
+    def test_recompile_gets_diff(self):
+        self.vocabulary.compile(self.compilation_func, ["HELLO"], incremental=True)
+        self.vocabulary.compile(
+            self.compilation_func,
+            ["HELLO", "GOODBYE"],
+            incremental=True
+        )
+        diff = self.diffs[-1]
+        self.assertEqual(diff.added_phrases, ["GOODBYE"])
+        self.assertEqual(diff.removed_phrases, [])
+
+
+class TestReadDictionary(unittest.TestCase):
+    def test_alternatives(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'dictionary')
+            with open(path, 'w') as f:
+                f.write("GOOD\tG UH D\nGOOD(2)\tG UW D\nBAD\tB AE D\n")
+            self.assertEqual(
+                vocabcompiler.read_dictionary(path),
+                {'good': ["G UH D", "G UW D"], 'bad': ["B AE D"]}
+            )
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestAtomicCompile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.vocabulary = vocabcompiler.VocabularyCompiler(
+            'test',
+            path=self.directory
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compilation_func(self, path, phrases):
+        with open(os.path.join(path, 'phrases'), 'w') as f:
+            f.write("\n".join(phrases))
+
+    def failing_compilation_func(self, path, phrases):
+        with open(os.path.join(path, 'phrases'), 'w') as f:
+            f.write("half written")
+        raise RuntimeError("compilation failed")
+
+    def read_phrases(self):
+        with open(os.path.join(self.vocabulary.path, 'phrases')) as f:
+            return f.read().splitlines()
+
+    def leftovers(self):
+        return sorted(
+            name for name in os.listdir(os.path.dirname(self.vocabulary.path))
+            if name != self.vocabulary.name
+        )
+
+    def test_build_replaces_vocabulary(self):
+        self.vocabulary.compile(self.compilation_func, ["HELLO"])
+        self.vocabulary.compile(self.compilation_func, ["GOODBYE"])
+        self.assertTrue(self.vocabulary.matches_phrases(["GOODBYE"]))
+        self.assertEqual(self.read_phrases(), ["GOODBYE"])
+        # Neither the build directory nor the old vocabulary is left
+        self.assertEqual(self.leftovers(), [])
+
+    def test_failed_build_keeps_vocabulary(self):
+        self.vocabulary.compile(self.compilation_func, ["HELLO"])
+        with self.assertRaises(RuntimeError):
+            self.vocabulary.compile(
+                self.failing_compilation_func,
+                ["GOODBYE"]
+            )
+        self.assertTrue(self.vocabulary.matches_phrases(["HELLO"]))
+        self.assertEqual(self.read_phrases(), ["HELLO"])
+        self.assertEqual(self.leftovers(), [])
+
+    def test_first_build_failure_leaves_nothing(self):
+        with self.assertRaises(RuntimeError):
+            self.vocabulary.compile(self.failing_compilation_func, ["HELLO"])
+        self.assertFalse(self.vocabulary.is_compiled)
+        self.assertFalse(os.path.exists(self.vocabulary.path))
+        self.assertEqual(self.leftovers(), [])
+
+    def test_interrupted_promotion_is_recovered(self):
+        self.vocabulary.compile(self.compilation_func, ["HELLO"])
+        # A crash between moving the old vocabulary aside and moving the
+        # new one in
+        os.rename(self.vocabulary.path, self.vocabulary.path + ".old")
+        self.vocabulary.compile(self.compilation_func, ["HELLO"])
+        self.assertEqual(self.read_phrases(), ["HELLO"])
+        self.assertEqual(self.leftovers(), [])
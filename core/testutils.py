@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import gettext
+import logging
+import unittest
+import wave
+from core import audioengine
+from core import paths
+from core import profile
+
+
+TEST_PROFILE = {
+    'language': 'en-US',
+    'keyword': ['Naomi'],
+    'audio': {
+        'input_samplerate': 16000,
+        'input_samplewidth': 16,
+        'input_channels': 1,
+        # 30ms chunks, so the same device works with webrtc_vad
+        'input_chunksize': 480
+    },
+    # Keep tests away from the pronunciation cache in the user's
+    # config directory
+    'g2p': {
+        'cache': False
+    }
+}
+
+
+def test_profile():
+    return TEST_PROFILE
+
+
+def get_plugin_instance(plugin_class, *extra_args):
+    info = type(
+        '',
+        (object,),
+        {
+            'name': 'pluginunittest',
+            'translations': {
+                'en-US': gettext.NullTranslations()
+            }
+        }
+    )()
+    args = tuple(extra_args) + (info,)
+    return plugin_class(*args)
+
+
+# An input device that "records" from a wav file instead of a microphone
+class TestInput(audioengine.AudioDevice):
+    def __init__(self, filename=None):
+        super(TestInput, self).__init__('unittest')
+        self._logger = logging.getLogger(__name__)
+        self.filename = filename
+
+    @property
+    def types(self):
+        return (audioengine.DEVICE_TYPE_INPUT,)
+
+    def supports_format(self, bits, channels, rate, output=True):
+        return not output
+
+    def record(self, chunksize, *args):
+        with wave.open(self.filename, 'rb') as w:
+            frame = w.readframes(chunksize)
+            while len(frame) == chunksize * w.getsampwidth() * w.getnchannels():
+                yield frame
+                frame = w.readframes(chunksize)
+
+
+class Test_VADPlugin(unittest.TestCase):
+    def setUp(self, *args, **kwargs):
+        self._logger = logging.getLogger(__name__)
+        profile.set_profile(test_profile())
+        self.time_clip = paths.data('audio', 'time.wav')
+        self._test_input = TestInput(self.time_clip)
+
+    # Run the voice activity detector over a whole wav file and log
+    # where it found utterances
+    def map_file(self, filename=None):
+        if filename is None:
+            filename = self.time_clip
+        segments = self.plugin.segment_file(filename)
+        rate = self._test_input._input_rate
+        for start, end in segments:
+            self._logger.info(
+                "{}: voice from {:.2f} to {:.2f} seconds".format(
+                    filename,
+                    start / rate,
+                    end / rate
+                )
+            )
+        return segments
+
+    def test_segment_file(self):
+        """
+        Does segment_file() find the same utterance as get_audio()?
+        """
+        plugin_class = type(self.plugin)
+        audio = get_plugin_instance(
+            plugin_class,
+            self._test_input
+        ).get_audio()
+        self.plugin = get_plugin_instance(plugin_class, self._test_input)
+        segments = self.map_file()
+        self.assertEqual(len(segments), 1)
+        start, end = segments[0]
+        self.assertEqual(
+            len(audio),
+            (end - start) * int(self._test_input._input_bits / 8)
+        )
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Signal to noise statistics shared by the voice activity detectors.
+
+Every frame's level is turned into a signal to noise ratio against the
+current threshold. The ratio goes into a noise floor estimator (see
+core/noisefloor.py), and the threshold is moved to mean + tolerance *
+stddev of what the estimator has seen. The lowest and highest plausible
+ratios are tracked for the "mic_volume" visualization.
+"""
+import math
+from core import noisefloor
+
+
+class SNRStatistics(object):
+    def __init__(
+        self,
+        threshold=30,
+        tolerance=1,
+        minimum_stddev=0,
+        estimator=None,
+        chunktime=0.03
+    ):
+        """
+        Arguments:
+            threshold -- the initial threshold
+            tolerance -- how many standard deviations above the mean a
+                         frame has to be to count as a voice
+            minimum_stddev -- (optional) never use a smaller standard
+                              deviation than this (Default: 0)
+            estimator -- (optional) a NoiseFloorEstimator (Default: the
+                         one configured in the profile)
+            chunktime -- (optional) the length of a frame in seconds, used
+                         to create the estimator from the profile
+        """
+        if estimator is None:
+            estimator = noisefloor.get_estimator(chunktime)
+        self._estimator = estimator
+        self._tolerance = tolerance
+        self._minimum_stddev = minimum_stddev
+        self.threshold = threshold
+        self.snr = 0
+        self.mean = 0.0
+        self.stddev = 0.0
+        self.minsnr = None
+        self.maxsnr = None
+
+    @property
+    def count(self):
+        return self._estimator.count
+
+    def update(self, level, recording=False):
+        """
+        Adds the level of a frame to the statistics.
+
+        Arguments:
+            level -- the root mean square of the frame
+            recording -- (optional) True while an utterance is being
+                         recorded, which lowers the threshold so trailing
+                         speech is kept
+
+        Returns:
+            True if the frame is loud enough to be a voice
+        """
+        if level > 0 and self.threshold > 0:
+            snr = round(20.0 * math.log10(level / self.threshold))
+        else:
+            snr = 0
+        self.snr = snr
+        estimator = self._estimator
+        estimator.update(snr)
+        mean = estimator.mean
+        self.mean = mean
+        if estimator.count > 1:
+            stddev = max(estimator.stddev, self._minimum_stddev)
+            self.stddev = stddev
+            self.threshold = mean + stddev * self._tolerance
+            # We'll say that the max possible value for SNR is mean+3*stddev
+            if self.minsnr is None:
+                self.minsnr = snr
+            if self.maxsnr is None:
+                self.maxsnr = snr
+            self.maxsnr = max(self.maxsnr, mean + 3 * stddev, snr)
+            self.minsnr = min(self.minsnr, mean - 3 * stddev, snr)
+        threshold = self.threshold
+        # If we are already recording, reduce the threshold so as
+        # the user's voice trails off, we continue to record.
+        # Here I am setting it to the halfway point between threshold
+        # and mean.
+        if recording:
+            threshold = (mean + threshold) / 2
+        return snr >= threshold
+
+    def visualization(self, recording=False):
+        """
+        Returns:
+            The keyword arguments for the "mic_volume" visualization
+            after the last update(), or None while there are not enough
+            frames to say anything yet
+        """
+        if self._estimator.count <= 1:
+            return None
+        return {
+            'recording': recording,
+            'snr': self.snr,
+            'minsnr': self.minsnr,
+            'maxsnr': self.maxsnr,
+            'mean': self.mean,
+            'threshold': self.threshold
+        }
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
+import collections
 import logging
+import threading
+import time
 from . import profile
 _visualizations = []
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
 
 
 def load_visualizations(self):
@@ -31,3 +36,125 @@ def run_visualization(visualization_name, *args, **kwargs):
         if visualization_name in dir(plugin):
             visualization = getattr(plugin, visualization_name)
             visualization(*args, **kwargs)
+
+
+class VisualizationDispatcher(object):
+    """
+    Runs visualizations on a renderer thread of their own, so a slow
+    terminal or display can not hold up the thread that posts them.
+
+    Events wait in a bounded queue. When the queue is full the oldest
+    event is dropped. The renderer draws at most fps frames per second
+    and, when several events for the same visualization are waiting, only
+    draws the newest one.
+    """
+
+    def __init__(self, fps=20, queue_size=16):
+        """
+        Arguments:
+            fps -- the most frames to draw per second, 0 for no limit
+            queue_size -- the most events waiting to be drawn
+        """
+        self._logger = logging.getLogger(__name__)
+        self._interval = 1.0 / fps if fps > 0 else 0
+        self._events = collections.deque(maxlen=max(1, int(queue_size)))
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.dropped = 0
+
+    def post(self, visualization_name, *args, **kwargs):
+        with self._condition:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append((visualization_name, args, kwargs))
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(
+                    target=self._render,
+                    name="visualizations",
+                    daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            thread = self._thread
+            self._thread = None
+            self._stopping = True
+            self._events.clear()
+            self._condition.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _render(self):
+        next_frame = time.monotonic()
+        while True:
+            with self._condition:
+                while not self._events and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+            # Wait for the next frame. Events that arrive in the meantime
+            # replace the ones already waiting.
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._condition:
+                if self._stopping:
+                    return
+                events = list(self._events)
+                self._events.clear()
+            latest = collections.OrderedDict()
+            for visualization_name, args, kwargs in events:
+                latest.pop(visualization_name, None)
+                latest[visualization_name] = (args, kwargs)
+            for visualization_name, (args, kwargs) in latest.items():
+                try:
+                    run_visualization(visualization_name, *args, **kwargs)
+                except Exception as e:
+                    self._logger.warning(
+                        "Visualization '%s' failed: %s",
+                        visualization_name,
+                        e,
+                        exc_info=(
+                            self._logger.getEffectiveLevel() == logging.DEBUG
+                        )
+                    )
+            next_frame = time.monotonic() + self._interval
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = VisualizationDispatcher(
+                fps=float(profile.get(['visualizations', 'fps'], 20)),
+                queue_size=int(profile.get(
+                    ['visualizations', 'queue_size'],
+                    16
+                ))
+            )
+        return _dispatcher
+
+
+def stop_dispatcher():
+    # Stops the renderer thread started by dispatch_visualization(). A
+    # later dispatch_visualization() starts a new one.
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher = _dispatcher
+        _dispatcher = None
+    if dispatcher is not None:
+        dispatcher.stop()
+
+
+def dispatch_visualization(visualization_name, *args, **kwargs):
+    # Like run_visualization(), but returns at once and leaves the drawing
+    # to the renderer thread. Use this for visualizations that are updated
+    # many times a second, like "mic_volume", where only the latest state
+    # matters.
+    if not _visualizations:
+        return
+    get_dispatcher().post(visualization_name, *args, **kwargs)
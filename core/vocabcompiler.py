@@ -4,9 +4,17 @@ Iterates over all the WORDS variables in the modules and creates a
 vocabulary for the respective stt_engine if needed.
 """
 import os
+import json
 import logging
 import hashlib
 import shutil
+import tempfile
+import time
+
+
+# Build directories older than this (in seconds) are left over from a
+# crash and can be removed
+STALE_BUILD_AGE = 3600
 
 
 def phrases_to_revision(phrases):
@@ -27,6 +35,68 @@ def phrases_to_revision(phrases):
     return sha1.hexdigest()
 
 
+def phrases_to_words(phrases):
+    """
+    Returns:
+        The set of unique words in phrases, in lower case.
+    """
+    return set(
+        word.lower() for phrase in phrases for word in phrase.split()
+    )
+
+
+class VocabularyDiff(object):
+    """
+    What changed between the phrases of the compiled vocabulary and the
+    phrases it is being compiled with now. removed_words are the words
+    (in lower case) no phrase uses any more, so their pronunciations can
+    be dropped. New words are simply the ones without a pronunciation.
+    """
+
+    def __init__(self, old_phrases, new_phrases):
+        old_phrases = set(old_phrases)
+        new_phrases = set(new_phrases)
+        self.added_phrases = sorted(new_phrases - old_phrases)
+        self.removed_phrases = sorted(old_phrases - new_phrases)
+        self.removed_words = sorted(
+            phrases_to_words(old_phrases) - phrases_to_words(new_phrases)
+        )
+
+    def __bool__(self):
+        return bool(self.added_phrases or self.removed_phrases)
+
+    def __repr__(self):
+        return (
+            "VocabularyDiff(+{} -{} phrases, -{} words)".format(
+                len(self.added_phrases),
+                len(self.removed_phrases),
+                len(self.removed_words)
+            )
+        )
+
+
+def read_dictionary(path):
+    """
+    Reads a pronunciation dictionary in the CMU format, where alternative
+    pronunciations are written as WORD(2).
+
+    Returns:
+        An ordered dictionary of word: [pronunciation, ...] with the
+        words in lower case.
+    """
+    lexicon = {}
+    with open(path, 'r') as f:
+        for line in f:
+            parts = line.split(None, 1)
+            if len(parts) < 2:
+                continue
+            word = parts[0]
+            if word.endswith(')') and '(' in word:
+                word = word[:word.index('(')]
+            lexicon.setdefault(word.lower(), []).append(parts[1].strip())
+    return lexicon
+
+
 class VocabularyCompiler(object):
     """
     Generic vocabulary compiler vocabulary compiler.
@@ -53,6 +123,15 @@ class VocabularyCompiler(object):
         """
         return os.path.join(self.path, 'revision')
 
+    @property
+    def phrases_file(self):
+        """
+        Returns:
+            The path of the file holding the phrases of the compiled
+            revision
+        """
+        return os.path.join(self.path, 'phrases.json')
+
     @property
     def is_compiled(self):
         """
@@ -82,6 +161,27 @@ class VocabularyCompiler(object):
         self._logger.debug("compiled_revision is '%s'", revision)
         return revision
 
+    @property
+    def compiled_phrases(self):
+        """
+        Reads the phrases the vocabulary was last compiled with.
+
+        Returns:
+            A list of phrases, or None if they were not stored or do not
+            belong to the compiled revision
+        """
+        revision = self.compiled_revision
+        if revision is None:
+            return None
+        try:
+            with open(self.phrases_file, 'r') as f:
+                phrases = json.load(f)
+        except (OSError, IOError, ValueError):
+            return None
+        if phrases_to_revision(phrases) != revision:
+            return None
+        return phrases
+
     def matches_phrases(self, phrases):
         """
         Convenience method to check if this vocabulary exactly contains the
@@ -97,22 +197,38 @@ class VocabularyCompiler(object):
         """
         return (self.compiled_revision == phrases_to_revision(phrases))
 
-    def compile(self, compilation_func, phrases, force=False):
+    def compile(
+        self,
+        compilation_func,
+        phrases,
+        force=False,
+        incremental=False
+    ):
         """
         Compiles this vocabulary. If the force argument is True, compilation
         will be forced regardless of necessity (which means that the
         preliminary check if the current revision already equals the
         revision after compilation will be skipped).
 
+        In incremental mode, compilation_func is called as
+        compilation_func(path, phrases, diff=diff) where diff is a
+        VocabularyDiff against the previously compiled phrases, so it can
+        patch the existing files. diff is None if there is nothing to
+        patch and everything has to be built. If patching fails, the
+        vocabulary is built from scratch.
+
         Arguments:
             phrases -- a list of phrases that this vocabulary will contain
             force -- (optional) forces compilation (Default: False)
+            incremental -- (optional) pass compilation_func the changes
+                           since the last compilation (Default: False)
 
         Returns:
             The revision of the compiled vocabulary
         """
         revision = phrases_to_revision(phrases)
         debug = self._logger.getEffectiveLevel() == logging.DEBUG
+        self._recover()
         if not force and self.compiled_revision == revision:
             self._logger.debug(
                 " ".join([
@@ -122,47 +238,123 @@ class VocabularyCompiler(object):
             )
             return revision
 
-        if not os.path.exists(self.path):
-            self._logger.debug(
-                "Vocabulary dir '{}' does not exist, creating...".format(
-                    self.path
-                )
+        diff = None
+        if incremental and not force:
+            previous = self.compiled_phrases
+            if previous is not None:
+                diff = VocabularyDiff(previous, phrases)
+                self._logger.debug("Incremental compilation: %r", diff)
+
+        # The vocabulary is built in a directory of its own next to the
+        # current one and only replaces it once it is complete, so a
+        # crash can't leave a half written vocabulary behind.
+        parent = os.path.dirname(self.path)
+        try:
+            os.makedirs(parent, exist_ok=True)
+            build_path = tempfile.mkdtemp(prefix=self._build_prefix, dir=parent)
+            # mkdtemp() only lets the owner in
+            os.chmod(build_path, 0o755)
+        except OSError:
+            self._logger.error(
+                "Couldn't create vocabulary dir in '{}'".format(parent),
+                exc_info=debug
             )
-            try:
-                os.makedirs(self.path)
-            except OSError:
-                self._logger.error(
-                    "Couldn't create vocabulary dir '{}'".format(self.path),
-                    exc_info=debug
-                )
-                raise
+            raise
+        self._logger.info('Starting compilation...')
         try:
-            with open(self.revision_file, 'w') as f:
+            if diff is not None:
+                try:
+                    # Patch a copy of the current vocabulary
+                    shutil.copytree(
+                        self.path,
+                        build_path,
+                        symlinks=True,
+                        dirs_exist_ok=True
+                    )
+                    compilation_func(build_path, phrases, diff=diff)
+                except Exception:
+                    self._logger.warning(
+                        "Incremental compilation failed, "
+                        "compiling everything",
+                        exc_info=debug
+                    )
+                    self._clear(build_path)
+                    compilation_func(build_path, phrases, diff=None)
+            elif incremental:
+                compilation_func(build_path, phrases, diff=None)
+            else:
+                compilation_func(build_path, phrases)
+            with open(os.path.join(build_path, 'phrases.json'), 'w') as f:
+                json.dump(sorted(phrases), f)
+            # The revision file marks the vocabulary as complete, so it is
+            # written last
+            with open(os.path.join(build_path, 'revision'), 'w') as f:
                 f.write(revision)
-        except (OSError, IOError):
-            self._logger.error("Couldn't write revision file in '%s'",
-                               self.revision_file, exc_info=debug)
-            raise
-        else:
-            self._logger.info('Starting compilation...')
+            self._promote(build_path)
+        except Exception as e:
+            msg = "Fatal compilation error occured"
+            if hasattr(e, 'message') and len(e.message) > 0:
+                msg += ": %s" % e.message
+            self._logger.error(msg, exc_info=debug)
             try:
-                compilation_func(self.path, phrases)
-            except Exception as e:
-                msg = "Fatal compilation error occured"
-                if hasattr(e, 'message') and len(e.message) > 0:
-                    msg += ": %s" % e.message
+                shutil.rmtree(build_path)
+            except EnvironmentError as e:
+                msg = 'Another error occured while cleaning up'
+                if e.strerror and e.errno:
+                    msg = '%s: %s (Errno: %d)' % (msg, e.strerror, e.errno)
+                else:
+                    msg = '%s: %r' % (msg, e.args)
                 self._logger.error(msg, exc_info=debug)
-                try:
-                    os.remove(self.revision_file)
-                    shutil.rmtree(self.path)
-                except EnvironmentError as e:
-                    msg = 'Another error occured while cleaning up'
-                    if e.strerror and e.errno:
-                        msg = '%s: %s (Errno: %d)' % (msg, e.strerror, e.errno)
-                    else:
-                        msg = '%s: %r' % (msg, e.args)
-                    self._logger.error(msg, exc_info=debug)
-                raise e
-            else:
-                self._logger.info('Compilation done.')
+            raise e
+        else:
+            self._logger.info('Compilation done.')
         return revision
+
+    @property
+    def _build_prefix(self):
+        return ".{}-build-".format(self.name)
+
+    @property
+    def _old_path(self):
+        return "{}.old".format(self.path)
+
+    def _promote(self, build_path):
+        # Replaces the current vocabulary with the one in build_path.
+        # Directories can't be swapped in a single step, so the current
+        # one is moved aside first. _recover() puts it back if we crash
+        # in between.
+        if os.path.exists(self._old_path):
+            shutil.rmtree(self._old_path)
+        if os.path.exists(self.path):
+            os.rename(self.path, self._old_path)
+        os.rename(build_path, self.path)
+        shutil.rmtree(self._old_path, ignore_errors=True)
+
+    def _recover(self):
+        # Cleans up after a build that did not finish
+        if not os.path.exists(self.path) and os.path.exists(self._old_path):
+            self._logger.info(
+                "Restoring vocabulary '{}'".format(self.path)
+            )
+            os.rename(self._old_path, self.path)
+        parent = os.path.dirname(self.path)
+        if not os.path.isdir(parent):
+            return
+        for name in os.listdir(parent):
+            path = os.path.join(parent, name)
+            # Builds still running in another process are left alone
+            if(
+                name.startswith(self._build_prefix)
+                and time.time() - os.path.getmtime(path) > STALE_BUILD_AGE
+            ):
+                shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _clear(directory):
+        # Removes everything in directory
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
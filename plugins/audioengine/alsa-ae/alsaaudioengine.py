@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
 import logging
 import contextlib
+import errno
+import select
+import time
 import alsaaudio
 from core import plugin
+from core import profile
 
 ALSAAUDIO_BIT_MAPPING = {8: alsaaudio.PCM_FORMAT_S8,
                          16: alsaaudio.PCM_FORMAT_S16_LE,
-                         24: alsaaudio.PCM_FORMAT_S24_LE,
+                         # Packed in three bytes, like everything else
+                         # in the assistant expects 24 bit audio to be
+                         24: alsaaudio.PCM_FORMAT_S24_3LE,
                          32: alsaaudio.PCM_FORMAT_S32_LE}
 
 
@@ -20,18 +26,26 @@ class AlsaAudioEnginePlugin(plugin.AudioEnginePlugin):
         super(AlsaAudioEnginePlugin, self).__init__(*args, **kwargs)
         self._logger = logging.getLogger(__name__)
 
-    def get_devices(self, device_type=plugin.audioengine.DEVICE_TYPE_ALL):
-        devices = set()
-        if device_type in (plugin.audioengine.DEVICE_TYPE_ALL,
-                           plugin.audioengine.DEVICE_TYPE_OUTPUT):
-            devices.update(set(alsaaudio.pcms(alsaaudio.PCM_PLAYBACK)))
-        if device_type in (plugin.audioengine.DEVICE_TYPE_ALL,
-                           plugin.audioengine.DEVICE_TYPE_INPUT):
-            devices.update(set(alsaaudio.pcms(alsaaudio.PCM_CAPTURE)))
-        device_names = sorted(list(devices))
+    def device_signature(self):
+        return (
+            tuple(alsaaudio.pcms(alsaaudio.PCM_CAPTURE)),
+            tuple(alsaaudio.pcms(alsaaudio.PCM_PLAYBACK))
+        )
+
+    def enumerate_devices(self):
+        capture, playback = self.device_signature()
+        device_names = sorted(set(capture) | set(playback))
         num_devices = len(device_names)
         self._logger.debug('Found %d ALSA devices', num_devices)
-        return [AlsaAudioDevice(name) for name in device_names]
+        devices = []
+        for name in device_names:
+            types = []
+            if name in capture:
+                types.append(plugin.audioengine.DEVICE_TYPE_INPUT)
+            if name in playback:
+                types.append(plugin.audioengine.DEVICE_TYPE_OUTPUT)
+            devices.append(AlsaAudioDevice(name, types))
+        return devices
 
     def get_default_device(self, output=True):
         device_name = 'default'
@@ -52,27 +66,26 @@ class AlsaAudioEnginePlugin(plugin.AudioEnginePlugin):
             raise plugin.audioengine.DeviceNotFound(msg)
         return devices[0]
 
-    def get_device_by_slug(self, slug):
-        for device in self.get_devices():
-            if device.slug == slug:
-                return device
-        raise plugin.audioengine.DeviceNotFound(
-            "Audio device with slug '%s' not found" % slug)
-
 
 class AlsaAudioDevice(plugin.audioengine.AudioDevice):
-    def __init__(self, name):
+    def __init__(self, name, types=None):
         super(AlsaAudioDevice, self).__init__(name)
         self._logger = logging.getLogger(__name__)
+        self._types = None if types is None else tuple(types)
+        # Capture statistics, kept across calls to record()
+        self.xruns = 0
+        self.read_errors = 0
 
     @property
     def types(self):
-        types = []
-        if self.name in alsaaudio.pcms(alsaaudio.PCM_CAPTURE):
-            types.append(plugin.audioengine.DEVICE_TYPE_INPUT)
-        if self.name in alsaaudio.pcms(alsaaudio.PCM_PLAYBACK):
-            types.append(plugin.audioengine.DEVICE_TYPE_OUTPUT)
-        return tuple(types)
+        if self._types is None:
+            types = []
+            if self.name in alsaaudio.pcms(alsaaudio.PCM_CAPTURE):
+                types.append(plugin.audioengine.DEVICE_TYPE_INPUT)
+            if self.name in alsaaudio.pcms(alsaaudio.PCM_PLAYBACK):
+                types.append(plugin.audioengine.DEVICE_TYPE_OUTPUT)
+            self._types = tuple(types)
+        return self._types
 
     def supports_format(self, bits, channels, rate, output=True):
         req_type = (plugin.audioengine.DEVICE_TYPE_OUTPUT if output
@@ -84,10 +97,18 @@ class AlsaAudioDevice(plugin.audioengine.AudioDevice):
         return True
 
     @contextlib.contextmanager
-    def open_stream(self, bits, channels, rate, chunksize=1024, output=True):
+    def open_stream(
+        self,
+        bits,
+        channels,
+        rate,
+        chunksize=1024,
+        output=True,
+        nonblock=False
+    ):
         # Check if format is supported
-        is_supported_fmt = self.supports_format(bits, channels, rate,
-                                                output=output)
+        is_supported_fmt = self.format_supported(bits, channels, rate,
+                                                 output=output)
         if not is_supported_fmt:
             msg_fmt = ("ALSAAudioDevice ({name}) doesn't support " +
                        "%s format (Int{bits}, {channels}-channel at" +
@@ -101,7 +122,8 @@ class AlsaAudioDevice(plugin.audioengine.AudioDevice):
         # Everything looks fine, open the PCM stream
         pcm_type = alsaaudio.PCM_PLAYBACK if output else alsaaudio.PCM_CAPTURE
         stream = alsaaudio.PCM(type=pcm_type,
-                               mode=alsaaudio.PCM_NORMAL,
+                               mode=(alsaaudio.PCM_NONBLOCK if nonblock
+                                     else alsaaudio.PCM_NORMAL),
                                device=self.name)
         stream.setchannels(channels)
         stream.setrate(rate)
@@ -117,8 +139,95 @@ class AlsaAudioDevice(plugin.audioengine.AudioDevice):
             self._logger.debug("%s stream closed on device '%s'",
                                "output" if output else "input", self.slug)
 
+    # Blocks until the capture stream has data, or for at most a few
+    # periods if the stream cannot be polled
+    def _wait(self, poller, timeout):
+        if poller is None:
+            time.sleep(timeout / 4)
+        else:
+            poller.poll(timeout * 1000)
+
+    def _poller(self, stream):
+        try:
+            descriptors = stream.polldescriptors()
+        except (AttributeError, alsaaudio.ALSAAudioError):
+            return None
+        poller = select.poll()
+        for fd, eventmask in descriptors:
+            poller.register(fd, eventmask)
+        return poller
+
     def record(self, chunksize, *args):
-        with self.open_stream(*args, chunksize=chunksize,
-                              output=False) as stream:
-            while True:
-                yield stream.read()[1]
+        """
+        Yields chunks of exactly chunksize frames.
+
+        By default the PCM is opened non-blocking and read whenever poll()
+        says data is ready. Whatever each read returns is copied into a
+        single chunk buffer, so periods that do not line up with chunksize
+        and short reads are handled. Overruns (xruns) are counted in
+        self.xruns. pyalsaaudio calls snd_pcm_prepare() when a read
+        overruns, so capture simply carries on with the next read. Any
+        other error is counted in self.read_errors and reopens the PCM.
+        The partial chunk read before the error is thrown away.
+        """
+        bits, channels, rate = args[:3]
+        nonblock = profile.get_profile_flag(['audio', 'alsa_nonblock'], True)
+        chunk = bytearray(chunksize * channels * (bits // 8))
+        view = memoryview(chunk)
+        period = chunksize / rate
+        while True:
+            # Never join audio from before and after a reopen in one chunk
+            filled = 0
+            with self.open_stream(
+                *args,
+                chunksize=chunksize,
+                output=False,
+                nonblock=nonblock
+            ) as stream:
+                poller = self._poller(stream) if nonblock else None
+                while True:
+                    try:
+                        length, data = stream.read()
+                    except alsaaudio.ALSAAudioError as e:
+                        self.read_errors += 1
+                        self._logger.warning(
+                            "Error reading from device '{}': {}".format(
+                                self.slug,
+                                e
+                            )
+                        )
+                        break
+                    if length == -errno.EPIPE:
+                        self.xruns += 1
+                        self._logger.warning(
+                            "Overrun on device '{}' ({} in total)".format(
+                                self.slug,
+                                self.xruns
+                            )
+                        )
+                        continue
+                    if length < 0:
+                        self.read_errors += 1
+                        self._logger.warning(
+                            "Error reading from device '{}': {}".format(
+                                self.slug,
+                                length
+                            )
+                        )
+                        break
+                    if length == 0:
+                        # Nothing available yet
+                        self._wait(poller, period)
+                        continue
+                    data = memoryview(data)
+                    offset = 0
+                    while offset < len(data):
+                        count = min(len(data) - offset, len(chunk) - filled)
+                        view[filled:filled + count] = data[offset:offset + count]
+                        filled += count
+                        offset += count
+                        if filled == len(chunk):
+                            filled = 0
+                            yield bytes(chunk)
+            # Give the device a moment before reopening it
+            time.sleep(period)
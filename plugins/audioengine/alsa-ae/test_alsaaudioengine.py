@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import itertools
+import unittest
+from unittest import mock
+from core import audioengine
+from core import profile
+from core import testutils
+from . import alsaaudioengine
+
+
+class FakePCM(object):
+    # Frames per read, not lined up with the chunk size like a real
+    # device whose period differs from it
+    READS = (100, 37, 250, 1)
+    instances = []
+
+    def __init__(self, type=None, mode=None, device=None):
+        self.format = None
+        self.channels = None
+        self._reads = itertools.cycle(self.READS)
+        FakePCM.instances.append(self)
+
+    def setchannels(self, channels):
+        self.channels = channels
+
+    def setrate(self, rate):
+        pass
+
+    def setformat(self, fmt):
+        self.format = fmt
+
+    def setperiodsize(self, size):
+        pass
+
+    def polldescriptors(self):
+        return []
+
+    def read(self):
+        frames = next(self._reads)
+        # 3 bytes per sample for S24_3LE
+        return (frames, bytes(range(256))[:3] * frames * self.channels)
+
+    def close(self):
+        pass
+
+
+class TestAlsaCapture(unittest.TestCase):
+    def setUp(self):
+        profile.set_profile(testutils.test_profile())
+        FakePCM.instances = []
+        self.device = alsaaudioengine.AlsaAudioDevice(
+            'default',
+            types=(audioengine.DEVICE_TYPE_INPUT,)
+        )
+
+    def test_24_bit_chunks(self):
+        chunksize = 480
+        channels = 2
+        with mock.patch.object(alsaaudioengine.alsaaudio, 'PCM', FakePCM):
+            chunks = list(itertools.islice(
+                self.device.record(chunksize, 24, channels, 16000),
+                10
+            ))
+        self.assertEqual(
+            FakePCM.instances[0].format,
+            alsaaudioengine.alsaaudio.PCM_FORMAT_S24_3LE
+        )
+        for chunk in chunks:
+            self.assertEqual(len(chunk), chunksize * channels * 3)
+            # Whole samples, never split across chunks
+            self.assertEqual(chunk[:3], b'\x00\x01\x02')
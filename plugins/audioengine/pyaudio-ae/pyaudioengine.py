@@ -3,6 +3,7 @@ import contextlib
 import logging
 import os
 import pyaudio
+import queue
 import re
 import slugify
 import sys
@@ -23,6 +24,254 @@ def bits_to_samplefmt(bits):
         return PYAUDIO_BIT_MAPPING[bits]
 
 
+def ioerror_args(e):
+    if type(e.errno) is not int:
+        # Simple hack to work around the fact that the
+        # errno/strerror arguments were swapped in older
+        # PyAudio versions. This was fixed in upstream
+        # commit 1783aaf9bcc6f8bffc478cb5120ccb6f5091b3fb.
+        return (e.errno, e.strerror)
+    return (e.strerror, e.errno)
+
+
+class PyAudioInputStream(object):
+    """
+    A long-lived PortAudio input stream for one device.
+
+    In callback mode PortAudio hands every chunk to _callback() on its own
+    thread, which only appends it to a bounded queue. read() takes chunks
+    off the queue, so capture keeps its timing while the Python side is
+    busy (with speech to text, for instance). If the consumer falls so far
+    behind that the queue is full, the new chunk is dropped and counted.
+
+    In blocking mode read() calls stream.read() directly, as before.
+
+    Input overflows are counted and the stream keeps being read. Other
+    errors are recovered by restarting the stream, then by reopening it.
+    Only this stream is touched, the PortAudio instance is shared with
+    the other devices. The number of frames lost along the way is kept
+    in dropped_frames.
+    """
+    RESTART = 1
+    REOPEN = 2
+
+    def __init__(
+        self,
+        device,
+        bits,
+        channels,
+        rate,
+        chunksize,
+        callback=True,
+        queue_size=64
+    ):
+        self._logger = logging.getLogger(__name__)
+        self._device = device
+        self._bits = bits
+        self._channels = channels
+        self._rate = rate
+        self._chunksize = chunksize
+        self._callback_mode = callback
+        # Only touched by the PortAudio thread (put) and the reader (get)
+        self._frames = queue.Queue(maxsize=max(int(queue_size), 1))
+        # How long read() waits for a chunk before it assumes the stream
+        # has stalled
+        self._stall_timeout = max(1.0, 8.0 * chunksize / rate)
+        self._stream = None
+        self._failures = 0
+        self._last_read = None
+        # Updated from the PortAudio thread, reported by read()
+        self._queue_drops = 0
+        self._overflows = 0
+        self._reported_queue_drops = 0
+        self._reported_overflows = 0
+        self.dropped_frames = 0
+        self.recoveries = 0
+        self._open()
+
+    @property
+    def format(self):
+        return (self._bits, self._channels, self._rate, self._chunksize)
+
+    @property
+    def callback_mode(self):
+        return self._callback_mode
+
+    def _open(self):
+        stream_kwargs = {
+            'format': bits_to_samplefmt(self._bits),
+            'channels': self._channels,
+            'rate': self._rate,
+            'input': True,
+            'output': False,
+            'input_device_index': self._device.index
+        }
+        if self._callback_mode:
+            stream_kwargs['frames_per_buffer'] = self._chunksize
+            stream_kwargs['stream_callback'] = self._callback
+        else:
+            # A blocking reader can fall behind while the frame is being
+            # processed, so give PortAudio room for a few chunks
+            stream_kwargs['frames_per_buffer'] = self._chunksize * 8
+        self._stream = self._device._engine._pyaudio.open(**stream_kwargs)
+        self._logger.debug(
+            "input stream opened on device '%s' (%d Hz, %d channel, %d bit%s)",
+            self._device.slug,
+            self._rate,
+            self._channels,
+            self._bits,
+            ", callback" if self._callback_mode else ""
+        )
+
+    def close(self):
+        if self._stream is not None:
+            try:
+                self._stream.stop_stream()
+                self._stream.close()
+            except (IOError, OSError):
+                pass
+            self._stream = None
+            self._logger.debug(
+                "input stream closed on device '%s'",
+                self._device.slug
+            )
+
+    # Runs on the PortAudio thread. It must never block, so all it does is
+    # queue the chunk and count problems for read() to report.
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paInputOverflow:
+            self._overflows += 1
+        try:
+            self._frames.put_nowait(in_data)
+        except queue.Full:
+            self._queue_drops += frame_count
+        return (None, pyaudio.paContinue)
+
+    def _drop(self, frames, reason):
+        self.dropped_frames += frames
+        self._logger.warning(
+            "Dropped {} frames on device '{}' ({}), {} in total".format(
+                frames,
+                self._device.slug,
+                reason,
+                self.dropped_frames
+            )
+        )
+
+    def _report_callback_problems(self):
+        queue_drops = self._queue_drops
+        if queue_drops != self._reported_queue_drops:
+            self._drop(
+                queue_drops - self._reported_queue_drops,
+                "capture queue full"
+            )
+            self._reported_queue_drops = queue_drops
+        overflows = self._overflows
+        if overflows != self._reported_overflows:
+            # PortAudio does not say how much was lost
+            self._logger.warning(
+                "Input overflow on device '{}' ({} in total)".format(
+                    self._device.slug,
+                    overflows
+                )
+            )
+            self._reported_overflows = overflows
+
+    def _recover(self):
+        self._failures += 1
+        self.recoveries += 1
+        step = min(self._failures, self.REOPEN)
+        try:
+            if step == self.RESTART:
+                self._logger.info(
+                    "Restarting input stream on '%s'", self._device.slug
+                )
+                self._stream.stop_stream()
+                self._stream.start_stream()
+            else:
+                self._logger.info(
+                    "Reopening input stream on '%s'", self._device.slug
+                )
+                if self._failures > self.REOPEN:
+                    # The device may have gone away, don't spin
+                    time.sleep(1)
+                self.close()
+                self._open()
+        except (IOError, OSError) as e:
+            strerror, errno = ioerror_args(e)
+            self._logger.warning(
+                "Recovery of '%s' failed: '%s' (Errno: %s)",
+                self._device.slug,
+                strerror,
+                errno
+            )
+
+    def _read_callback(self):
+        try:
+            frame = self._frames.get(timeout=self._stall_timeout)
+        except queue.Empty:
+            self._logger.warning(
+                "No audio from device '{}' for {:.1f} seconds".format(
+                    self._device.slug,
+                    self._stall_timeout
+                )
+            )
+            return None
+        self._report_callback_problems()
+        return frame
+
+    def _read_blocking(self):
+        while True:
+            try:
+                return self._stream.read(
+                    self._chunksize,
+                    exception_on_overflow=True
+                )
+            except IOError as e:
+                strerror, errno = ioerror_args(e)
+                if errno == pyaudio.paInputOverflowed:
+                    # The stream is still healthy, we just were not
+                    # reading fast enough and lost this chunk
+                    self._drop(self._chunksize, "input overflow")
+                    continue
+                self._logger.warning(
+                    "IO error while reading from device" +
+                    " '%s': '%s' (Errno: %s)" % (
+                        self._device.slug,
+                        strerror,
+                        errno
+                    )
+                )
+                return None
+
+    def read(self):
+        while True:
+            if self._stream is None:
+                frame = None
+            elif self._callback_mode:
+                frame = self._read_callback()
+            else:
+                frame = self._read_blocking()
+            if frame is None:
+                self._recover()
+                continue
+            now = time.monotonic()
+            if (
+                self._failures > 0
+                and not self._callback_mode
+                and self._last_read is not None
+            ):
+                # Count the audio that went by while we recovered
+                missed = int(
+                    (now - self._last_read) * self._rate
+                ) - 2 * self._chunksize
+                if missed > 0:
+                    self._drop(missed, "stream recovery")
+            self._failures = 0
+            self._last_read = now
+            return frame
+
+
 class PyAudioEnginePlugin(plugin.AudioEnginePlugin):
 
     def __init__(self, *args, **kwargs):
@@ -40,15 +289,11 @@ class PyAudioEnginePlugin(plugin.AudioEnginePlugin):
     def __del__(self):
         self._pyaudio.terminate()
 
-    def get_devices(self, device_type=plugin.audioengine.DEVICE_TYPE_ALL):
+    def enumerate_devices(self):
         num_devices = self._pyaudio.get_device_count()
         self._logger.debug('Found %d PyAudio devices', num_devices)
-        devs = [PyAudioDevice(self, self._pyaudio.get_device_info_by_index(i))
+        return [PyAudioDevice(self, self._pyaudio.get_device_info_by_index(i))
                 for i in range(num_devices)]
-        if device_type == plugin.audioengine.DEVICE_TYPE_ALL:
-            return devs
-        else:
-            return [device for device in devs if device_type in device.types]
 
     def get_default_device(self, output=True):
         try:
@@ -71,15 +316,11 @@ class PyAudioEnginePlugin(plugin.AudioEnginePlugin):
                 device = devices[0]
             return device
         else:
+            for device in self.get_devices():
+                if device.index == info['index']:
+                    return device
             return PyAudioDevice(self, info)
 
-    def get_device_by_slug(self, slug):
-        for device in self. get_devices():
-            if device.slug == slug:
-                return device
-        raise plugin.audioengine.DeviceNotFound(
-            "Audio device with slug '%s' not found" % slug)
-
 
 class PyAudioDevice(plugin.audioengine.AudioDevice):
     RE_PRESLUG = re.compile(r'\(hw:\d,\d\)')
@@ -100,6 +341,7 @@ class PyAudioDevice(plugin.audioengine.AudioDevice):
         if preslug_name.endswith(': - '):
             preslug_name = self.name
         self._pyaudio_slug = slugify.slugify(preslug_name)
+        self._input_stream = None
 
     @property
     def slug(self):
@@ -109,6 +351,12 @@ class PyAudioDevice(plugin.audioengine.AudioDevice):
     def index(self):
         return self._index
 
+    @property
+    def dropped_frames(self):
+        if self._input_stream is None:
+            return 0
+        return self._input_stream.dropped_frames
+
     @property
     def types(self):
         types = []
@@ -146,11 +394,9 @@ class PyAudioDevice(plugin.audioengine.AudioDevice):
         else:
             return supported
 
-    @contextlib.contextmanager
-    def open_stream(self, bits, channels, rate, chunksize=1024, output=True):
-        # Check if format is supported
-        is_supported_fmt = self.supports_format(bits, channels, rate,
-                                                output=output)
+    def _check_format(self, bits, channels, rate, output):
+        is_supported_fmt = self.format_supported(bits, channels, rate,
+                                                 output=output)
         if not is_supported_fmt:
             msg_fmt = ("PyAudioDevice {index} ({name}) doesn't support " +
                        "%s format (Int{bits}, {channels}-channel at" +
@@ -162,8 +408,12 @@ class PyAudioDevice(plugin.audioengine.AudioDevice):
                                  rate=rate)
             self._logger.critical(msg)
             raise plugin.audioengine.UnsupportedFormat(msg)
+
+    @contextlib.contextmanager
+    def open_stream(self, bits, channels, rate, chunksize=1024, output=True):
+        # Check if format is supported
+        self._check_format(bits, channels, rate, output)
         # Everything looks fine, open the stream
-        self._engine._pyaudio = pyaudio.PyAudio()
         direction = ('output' if output else 'input')
         stream_kwargs = {
             'format': bits_to_samplefmt(bits),
@@ -172,7 +422,7 @@ class PyAudioDevice(plugin.audioengine.AudioDevice):
             'output': output,
             'input': not output,
             ('%s_device_index' % direction): self.index,
-            'frames_per_buffer': chunksize if output else chunksize * 8  # Hacky
+            'frames_per_buffer': chunksize
         }
         stream = self._engine._pyaudio.open(**stream_kwargs)
 
@@ -184,40 +434,41 @@ class PyAudioDevice(plugin.audioengine.AudioDevice):
         finally:
             stream.stop_stream()
             stream.close()
-            self._engine._pyaudio.terminate()
             self._logger.debug("%s stream closed on device '%s'",
                                "output" if output else "input", self.slug)
 
+    # Returns the input stream for this device, opening it the first time.
+    # The stream stays open between calls to record(), so PortAudio is not
+    # set up again for every utterance.
+    def get_input_stream(self, bits, channels, rate, chunksize=1024):
+        if self._input_stream is not None:
+            if self._input_stream.format == (bits, channels, rate, chunksize):
+                return self._input_stream
+            self.close_input_stream()
+        self._check_format(bits, channels, rate, False)
+        self._input_stream = PyAudioInputStream(
+            self,
+            bits,
+            channels,
+            rate,
+            chunksize,
+            callback=profile.get_profile_flag(
+                ['audio', 'pyaudio_callback'],
+                True
+            ),
+            queue_size=profile.get(['audio', 'capture_queue_size'], 64)
+        )
+        return self._input_stream
+
+    def close_input_stream(self):
+        if self._input_stream is not None:
+            self._input_stream.close()
+            self._input_stream = None
+
     def record(self, chunksize, *args):
-        # AJC 2018-08-02 Add a second while loop so if the pyaudio stream
-        # gets closed, we immediately reopen it rather than continue
-        # to try to read from a closed stream
+        stream = self.get_input_stream(*args, chunksize=chunksize)
         while True:
-            with self.open_stream(*args, chunksize=chunksize,
-                                output=False) as stream:
-                while True:
-                    try:
-                        frame = stream.read(chunksize)
-                    except IOError as e:
-                        if type(e.errno) is not int:
-                            # Simple hack to work around the fact that the
-                            # errno/strerror arguments were swapped in older
-                            # PyAudio versions. This was fixed in upstream
-                            # commit 1783aaf9bcc6f8bffc478cb5120ccb6f5091b3fb.
-                            strerror, errno = e.errno, e.strerror
-                        else:
-                            strerror, errno = e.strerror, e.errno
-                        self._logger.warning(
-                            "IO error while reading from device" +
-                            " '%s': '%s' (Errno: %d)" % (
-                                self.slug,
-                                strerror,
-                                errno
-                            )
-                        )
-                        break
-                    else:
-                        yield frame
+            yield stream.read()
 
     def play_fp(self, fp, *args, **kwargs):
         self._stop = False
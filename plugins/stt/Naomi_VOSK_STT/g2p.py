@@ -4,6 +4,8 @@ import re
 import subprocess
 import tempfile
 import logging
+from core import g2pservice
+from core import pronunciationcache
 from . import phonemeconversion
 
 
@@ -156,6 +158,15 @@ class PhonetisaurusG2P(object):
 
     def _translate_words(self, words):
         self._logger.debug("enter _translate_words")
+        # The service keeps the model loaded between vocabulary compiles
+        # and only falls back to running the executable if it can't
+        return g2pservice.get_service(self.fst_model).translate(
+            words,
+            nbest=self.nbest,
+            fallback=self._execute_words
+        )
+
+    def _execute_words(self, words, nbest):
         with tempfile.NamedTemporaryFile(suffix='.g2p', delete=False) as f:
             # The 'delete=False' kwarg is kind of a hack, but Phonetisaurus
             # won't work if we remove it, because it seems that I can't open
@@ -166,27 +177,37 @@ class PhonetisaurusG2P(object):
             tmp_fname = f.name
         self._logger.debug(
             ("%s --model=%s --beam=1000 --thresh=99.0 --accumulate=true " +
-            "--pmass=0.85 --nlog_probs=false --wordlist=%s --nbest=%d") %
-            (self.executable, self.fst_model, tmp_fname, self.nbest)
-        )
-
-        output = execute(
-            self.executable,
-            self.fst_model,
-            tmp_fname,
-            is_file=True,
-            nbest=self.nbest
+            "--pmass=0.85 --nlog_probs=false --wordlist=%s --nbest=%s") %
+            (self.executable, self.fst_model, tmp_fname, nbest)
         )
-
-        os.remove(tmp_fname)
-        return output
+        try:
+            return execute(
+                self.executable,
+                self.fst_model,
+                tmp_fname,
+                is_file=True,
+                nbest=nbest
+            )
+        finally:
+            os.remove(tmp_fname)
 
     def translate(self, words):
         self._logger.debug('Converting {} word{} to phonemes'.format(
             len(words),
             's' if len(words) > 1 else ''
         ))
-        output = self._translate_words(words)
+        cache = pronunciationcache.get_cache()
+        if cache is None:
+            output = self._translate_words(words)
+        else:
+            # Only the words that aren't cached yet go to Phonetisaurus
+            output = cache.translate(
+                self.fst_model,
+                self.nbest,
+                self.fst_model_alphabet,
+                words,
+                self._translate_words
+            )
         self._logger.debug(
             'G2P conversion returned phonemes for {} word{}'.format(
                 len(output),
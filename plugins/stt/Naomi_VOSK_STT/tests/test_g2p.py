@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
 import unittest
-from naomi import profile
-from naomi import testutils
-import mock
+from unittest import mock
+from core import g2pservice
+from core import profile
+from core import pronunciationcache
+from core import testutils
 from .. import g2p
+from .. import voskvocab
 
 
 WORDS = ['GOOD', 'BAD', 'UGLY']
@@ -57,6 +63,7 @@ class DummyProc(object):
 
 class TestPatchedG2P(unittest.TestCase):
     def setUp(self):
+        profile.set_profile(testutils.test_profile())
         self.g2pconv = g2p.PhonetisaurusG2P(
             'phonetisaurus-g2pfst',
             'dummy_fst_model.fst',
@@ -85,3 +92,128 @@ class TestPatchedG2P(unittest.TestCase):
             results = self.g2pconv.translate(WORDS).keys()
             for word in WORDS:
                 self.assertIn(word, results)
+
+
+class DummyPath(object):
+    def __init__(self, uniques):
+        self.Uniques = uniques
+
+
+class DummyPhonetisaurusScript(object):
+    loaded = 0
+
+    def __init__(self, fst_model):
+        DummyPhonetisaurusScript.loaded += 1
+
+    def Phoneticize(self, word, nbest, *args):
+        return [DummyPath(list(range(len(word))))] * nbest
+
+    def FindIsym(self, symbol):
+        # A model trained on lower case words
+        return ord(symbol) if symbol.islower() else g2pservice.NO_SYMBOL
+
+    def FindOsym(self, symbol):
+        return "P{}".format(symbol)
+
+
+class TestG2PService(unittest.TestCase):
+    def setUp(self):
+        profile.set_profile(testutils.test_profile())
+
+    def testModelLoadedOnce(self):
+        with mock.patch.object(
+            g2pservice,
+            'PhonetisaurusScript',
+            DummyPhonetisaurusScript
+        ), mock.patch.dict(g2pservice._services, clear=True):
+            DummyPhonetisaurusScript.loaded = 0
+            for i in range(3):
+                g2pconv = g2p.PhonetisaurusG2P(
+                    'phonetisaurus-g2pfst',
+                    'dummy_fst_model.fst',
+                    nbest=2
+                )
+                results = g2pconv.translate(
+                    [word.lower() for word in WORDS]
+                )
+            self.assertEqual(DummyPhonetisaurusScript.loaded, 1)
+            self.assertEqual(results['bad'], ["P0 P1 P2", "P0 P1 P2"])
+
+    def testUnknownSymbolsLeftOut(self):
+        with mock.patch.object(
+            g2pservice,
+            'PhonetisaurusScript',
+            DummyPhonetisaurusScript
+        ), mock.patch.dict(g2pservice._services, clear=True):
+            g2pconv = g2p.PhonetisaurusG2P(
+                'phonetisaurus-g2pfst',
+                'dummy_fst_model.fst'
+            )
+            self.assertEqual(
+                g2pconv.translate(['good', 'BAD']),
+                {'good': ["P0 P1 P2 P3"]}
+            )
+
+    def testDictionaryRetriesLowerCase(self):
+        with mock.patch.object(
+            g2pservice,
+            'PhonetisaurusScript',
+            DummyPhonetisaurusScript
+        ), mock.patch.dict(g2pservice._services, clear=True):
+            g2pconv = g2p.PhonetisaurusG2P(
+                'phonetisaurus-g2pfst',
+                'dummy_fst_model.fst'
+            )
+            directory = tempfile.mkdtemp()
+            try:
+                dictionary = os.path.join(directory, 'dictionary')
+                voskvocab.compile_dictionary(
+                    g2pconv,
+                    ['Good', 'bad'],
+                    dictionary
+                )
+                with open(dictionary) as f:
+                    lines = sorted(f.read().splitlines())
+            finally:
+                shutil.rmtree(directory)
+            self.assertEqual(lines, ["BAD\tP0 P1 P2", "GOOD\tP0 P1 P2 P3"])
+
+
+class TestPronunciationCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fst_model = os.path.join(self.directory, 'model.fst')
+        with open(self.fst_model, 'w') as f:
+            f.write('dummy')
+        self.cache = pronunciationcache.PronunciationCache(
+            os.path.join(self.directory, 'pronunciations.db')
+        )
+        self.requested = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def translate(self, words):
+        self.requested.append(words)
+        return {word: [" ".join(word)] for word in words if word != 'UGLY'}
+
+    def testOnlyMissesTranslated(self):
+        first = self.cache.translate(
+            self.fst_model, 3, 'arpabet', WORDS, self.translate
+        )
+        second = self.cache.translate(
+            self.fst_model, 3, 'arpabet', WORDS + ['NEW'], self.translate
+        )
+        self.assertEqual(self.requested, [WORDS, ['NEW']])
+        self.assertEqual(first, {'GOOD': ["G O O D"], 'BAD': ["B A D"]})
+        self.assertEqual(second['NEW'], ["N E W"])
+        self.assertNotIn('UGLY', second)
+
+    def testDisabledInTestProfile(self):
+        profile.set_profile(testutils.test_profile())
+        self.assertIsNone(pronunciationcache.get_cache())
+
+    def testKeyedByNbest(self):
+        self.cache.translate(self.fst_model, 3, 'arpabet', WORDS, self.translate)
+        self.cache.translate(self.fst_model, 1, 'arpabet', WORDS, self.translate)
+        self.assertEqual(self.requested, [WORDS, WORDS])
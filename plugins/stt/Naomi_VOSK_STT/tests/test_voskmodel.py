@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import mock
+import unittest
+from .. import voskmodel
+
+
+class TestVoskModelRegistry(unittest.TestCase):
+    def testModelIsShared(self):
+        with mock.patch.object(voskmodel, 'Model') as model_class:
+            first = voskmodel.acquire_model('/tmp/vosk-model', 16000)
+            second = voskmodel.acquire_model('/tmp/vosk-model', 16000)
+            self.assertIs(first, second)
+            self.assertEqual(model_class.call_count, 1)
+            voskmodel.release_model('/tmp/vosk-model', 16000)
+            voskmodel.release_model('/tmp/vosk-model', 16000)
+            voskmodel.acquire_model('/tmp/vosk-model', 16000)
+            self.assertEqual(model_class.call_count, 2)
+            voskmodel.release_model('/tmp/vosk-model', 16000)
+
+    def testRatesAreSeparate(self):
+        with mock.patch.object(voskmodel, 'Model') as model_class:
+            voskmodel.acquire_model('/tmp/vosk-model', 16000)
+            voskmodel.acquire_model('/tmp/vosk-model', 8000)
+            self.assertEqual(model_class.call_count, 2)
+            voskmodel.release_model('/tmp/vosk-model', 16000)
+            voskmodel.release_model('/tmp/vosk-model', 8000)
+
+
+class TestRecognizerPool(unittest.TestCase):
+    def testCheckoutCheckin(self):
+        with mock.patch.object(voskmodel, 'KaldiRecognizer') as rec_class:
+            rec_class.side_effect = lambda *args: mock.Mock()
+            pool = voskmodel.RecognizerPool(mock.Mock(), 16000, size=2)
+            first = pool.checkout()
+            second = pool.checkout()
+            self.assertIsNot(first, second)
+            self.assertEqual(rec_class.call_count, 2)
+            pool.checkin(first)
+            first.Reset.assert_called_once_with()
+            with pool.recognizer() as rec:
+                self.assertIs(rec, first)
+            self.assertEqual(rec_class.call_count, 2)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from core import profile
+from core import testutils
+from core import vocabcompiler
+from .. import voskvocab
+
+
+PRONUNCIATIONS = {
+    'TURN': ["T ER N"],
+    'ON': ["AA N"],
+    'OFF': ["AO F"],
+    'THE': ["DH AH"],
+    'LIGHT': ["L AY T"],
+    'RADIO': ["R EY D IY OW"]
+}
+
+
+class DummyG2P(object):
+    requested = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def translate(self, words):
+        DummyG2P.requested.append(sorted(words))
+        return {word: PRONUNCIATIONS[word] for word in words}
+
+
+class TestIncrementalDictionary(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        fst_model = os.path.join(self.directory, 'model.fst')
+        with open(fst_model, 'w') as f:
+            f.write('dummy')
+        test_profile = copy.deepcopy(testutils.test_profile())
+        test_profile['pocketsphinx'] = {'fst_model': fst_model}
+        profile.set_profile(test_profile)
+        self.vocabulary = vocabcompiler.VocabularyCompiler(
+            'voskvocab',
+            path=self.directory
+        )
+        DummyG2P.requested = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compile(self, phrases):
+        with mock.patch.object(voskvocab, 'PhonetisaurusG2P', DummyG2P):
+            self.vocabulary.compile(
+                voskvocab.compile_vocabulary,
+                phrases,
+                incremental=True
+            )
+        return vocabcompiler.read_dictionary(
+            voskvocab.get_dictionary_path(self.vocabulary.path)
+        )
+
+    def test_reuses_pronunciations(self):
+        self.compile(["TURN ON THE LIGHT", "TURN ON THE RADIO"])
+        dictionary = self.compile(["TURN ON THE LIGHT", "TURN OFF THE LIGHT"])
+        # Only the new word is looked up, "radio" is dropped
+        self.assertEqual(
+            DummyG2P.requested,
+            [["LIGHT", "ON", "RADIO", "THE", "TURN"], ["OFF"]]
+        )
+        self.assertEqual(
+            sorted(dictionary),
+            ["light", "off", "on", "the", "turn"]
+        )
+        self.assertEqual(dictionary['turn'], ["T ER N"])
+
+
+class TestLanguageModel(unittest.TestCase):
+    def test_keyword_slots_not_in_vocabulary(self):
+        profile.set_profile(testutils.test_profile())
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'languagemodel')
+            words = voskvocab.compile_languagemodel(
+                ["WHAT IS THE WEATHER IN {LOCATION}", "WHAT TIME IS IT"],
+                path
+            )
+            with open(path) as f:
+                arpa = f.read()
+        finally:
+            shutil.rmtree(directory)
+        self.assertNotIn("{LOCATION}", words)
+        self.assertIn("WEATHER", words)
+        # The slot is still part of the language model
+        self.assertIn("{LOCATION}", arpa)
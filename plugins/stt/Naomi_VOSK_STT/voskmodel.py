@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide registry of loaded VOSK models.
+
+Loading a model takes a while and can use hundreds of megabytes, so
+every plugin instance that uses the same model at the same sample rate
+shares a single Model object. The registry counts how many instances hold
+each model and drops it when the last one releases it.
+
+Recognizers keep per-utterance state and are not thread safe, so each
+plugin instance checks them out of a RecognizerPool bound to its shared
+model. Several utterances can then be decoded at the same time.
+"""
+import contextlib
+import logging
+import os
+import queue
+import threading
+from vosk import KaldiRecognizer
+from vosk import Model
+
+
+_models = {}
+_lock = threading.Lock()
+
+
+def _model_key(path, rate):
+    return (os.path.realpath(path), int(rate))
+
+
+def acquire_model(path, rate, lang="en-us"):
+    """
+    Returns the model stored at path, loading it if no other plugin
+    instance is using it yet. Every call must be matched by a call to
+    release_model().
+
+    Arguments:
+        path -- the directory containing the VOSK model
+        rate -- the sample rate recognizers will use with the model
+        lang -- (optional) the model language (Default: 'en-us')
+    """
+    key = _model_key(path, rate)
+    with _lock:
+        if key in _models:
+            entry = _models[key]
+            entry['references'] += 1
+        else:
+            logging.getLogger(__name__).info(
+                "Loading VOSK model '{}'".format(key[0])
+            )
+            entry = {'model': Model(key[0], lang=lang), 'references': 1}
+            _models[key] = entry
+        return entry['model']
+
+
+def release_model(path, rate):
+    """
+    Releases a model returned by acquire_model(). The model is unloaded
+    once nothing holds it.
+    """
+    key = _model_key(path, rate)
+    with _lock:
+        entry = _models.get(key)
+        if entry is None:
+            return
+        entry['references'] -= 1
+        if entry['references'] <= 0:
+            logging.getLogger(__name__).info(
+                "Unloading VOSK model '{}'".format(key[0])
+            )
+            del _models[key]
+
+
+class RecognizerPool(object):
+    """
+    A fixed maximum number of KaldiRecognizer objects for one model.
+    Recognizers are created the first time they are needed. A recognizer
+    is reset when it is checked back in, so no state carries over from
+    one utterance to the next.
+    """
+
+    def __init__(self, model, rate, size=1):
+        self._logger = logging.getLogger(__name__)
+        self._model = model
+        self._rate = rate
+        self._size = max(int(size), 1)
+        self._created = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    def checkout(self):
+        """
+        Returns a recognizer for the caller's exclusive use, waiting for
+        one to be checked in if all of them are busy.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self._size:
+                self._created += 1
+                self._logger.debug(
+                    "Creating recognizer {} of {}".format(
+                        self._created,
+                        self._size
+                    )
+                )
+                return KaldiRecognizer(self._model, self._rate)
+        return self._idle.get()
+
+    def checkin(self, recognizer):
+        recognizer.Reset()
+        self._idle.put(recognizer)
+
+    @contextlib.contextmanager
+    def recognizer(self):
+        recognizer = self.checkout()
+        try:
+            yield recognizer
+        finally:
+            self.checkin(recognizer)
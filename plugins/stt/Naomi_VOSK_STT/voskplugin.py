@@ -2,6 +2,7 @@
 import json
 import os.path
 import sys
+import wave
 from collections import OrderedDict
 from core import app_utils
 from core import paths
@@ -9,7 +10,7 @@ from core import plugin
 from core import profile
 from core.run_command import run_command
 from core.run_command import process_completedprocess
-from vosk import Model, KaldiRecognizer
+from . import voskmodel
 from . import voskvocab
 
 
@@ -29,11 +30,13 @@ def line_generator(items):
         yield "\n"
 
 
-class VoskSTTPlugin(plugin.STTPlugin):
+class VoskSTTPlugin(plugin.STTStreamingMixin, plugin.STTPlugin):
     """
     The default Speech-to-Text implementation which relies on PocketSphinx.
     """
     _logfile = None
+    # Every call gets its own recognizer from the pool
+    thread_safe = True
 
     def __init__(self, *args, **kwargs):
         """
@@ -49,8 +52,24 @@ class VoskSTTPlugin(plugin.STTPlugin):
                 'vosk-model-small-en-us-0.15'
             )
         )
-        model = Model(vosk_model, lang="en-us")
-        self.rec = KaldiRecognizer(model, 16000)
+        # The passive and active instances usually use the same model, so
+        # it is loaded once and shared
+        self._model_path = vosk_model
+        self._model = voskmodel.acquire_model(
+            vosk_model,
+            self._samplerate,
+            lang="en-us"
+        )
+        # One recognizer per STT worker, so they can decode in parallel
+        self._recognizers = voskmodel.RecognizerPool(
+            self._model,
+            self._samplerate,
+            size=profile.get(
+                ['VOSK STT', 'recognizers'],
+                profile.get(['stt', 'workers'], 1)
+            )
+        )
+        self._stream_rec = None
         scorer_file = os.path.join(
             self.compile_vocabulary(
                 self.generate_scorer
@@ -59,6 +78,11 @@ class VoskSTTPlugin(plugin.STTPlugin):
         print(f'Vosk scorer file: {scorer_file}')
 
 
+    def __del__(self):
+        if getattr(self, '_model', None) is not None:
+            self._model = None
+            voskmodel.release_model(self._model_path, self._samplerate)
+
     def settings(self):
         default_model='vosk-model-small-en-us-0.15'
         vosk_model = profile.get(
@@ -118,14 +142,105 @@ class VoskSTTPlugin(plugin.STTPlugin):
         Arguments:
             fp -- a file object containing audio data
         """
-        fp.seek(44)
-        data = fp.read()
-
-        if(len(data) == 0):
-            self._logger.warn(f"Audio file is empty")
-            return ""
-        self.rec.AcceptWaveform(data)
-        res = json.loads(self.rec.Result())
+        with wave.open(fp, 'rb') as w:
+            return self.transcribe_pcm(
+                w.readframes(w.getnframes()),
+                w.getframerate(),
+                w.getsampwidth(),
+                w.getnchannels()
+            )
+
+    def start_stream(self, rate, width, channels):
+        """
+        Starts decoding a new utterance. Audio passed to feed_stream() is
+        decoded as it arrives.
+        """
+        self._check_format(rate, width, channels)
+        if self._stream_rec is not None:
+            self._recognizers.checkin(self._stream_rec)
+        # The recognizer stays checked out until the utterance ends
+        self._stream_rec = self._recognizers.checkout()
+        # text of the segments Kaldi has already finalized because it
+        # detected a pause inside the utterance
+        self._stream_text = []
+
+    def feed_stream(self, buffer):
+        """
+        Adds audio to the current utterance.
+
+        Returns:
+            The transcription so far, including the partial result for
+            the audio that has not been finalized yet
+        """
+        if not isinstance(buffer, bytes):
+            buffer = bytes(buffer)
+        if self._stream_rec.AcceptWaveform(buffer):
+            text = json.loads(self._stream_rec.Result())['text']
+            if text:
+                self._stream_text.append(text)
+            partial = ''
+        else:
+            partial = json.loads(self._stream_rec.PartialResult())['partial']
+        return " ".join(self._stream_text + ([partial] if partial else []))
+
+    def end_stream(self):
+        """
+        Finishes the current utterance.
+
+        Returns:
+            A list containing the transcription, or an empty list
+        """
+        text = json.loads(self._stream_rec.FinalResult())['text']
+        self._recognizers.checkin(self._stream_rec)
+        self._stream_rec = None
+        if text:
+            self._stream_text.append(text)
+        result = " ".join(self._stream_text)
+        self._stream_text = []
+        return [result] if result != '' else []
+
+    def cancel_stream(self):
+        if self._stream_rec is not None:
+            self._recognizers.checkin(self._stream_rec)
+            self._stream_rec = None
+        self._stream_text = []
+
+    def _check_format(self, rate, width, channels):
+        if (width, channels) != (2, 1):
+            raise ValueError(
+                "VOSK requires 16 bit mono audio, got {} bit {} channel".format(
+                    width * 8,
+                    channels
+                )
+            )
+        if rate != self._samplerate:
+            self._logger.warning(
+                "Audio is {} Hz but the recognizer expects {} Hz".format(
+                    rate,
+                    self._samplerate
+                )
+            )
+
+    def transcribe_pcm(self, buffer, rate, width, channels):
+        """
+        Performs STT on raw PCM audio held in memory.
+
+        Arguments:
+            buffer -- a bytes-like object containing 16 bit mono audio
+            rate -- the sample rate in Hz
+            width -- the sample width in bytes
+            channels -- the number of channels
+        """
+        if(len(buffer) == 0):
+            self._logger.warning("Audio buffer is empty")
+            return []
+        self._check_format(rate, width, channels)
+        # The recognizer only accepts bytes
+        if not isinstance(buffer, bytes):
+            buffer = bytes(buffer)
+        with self._recognizers.recognizer() as rec:
+            rec.AcceptWaveform(buffer)
+            res = json.loads(rec.Result())
         result = res['text']
         transcribed = [result] if result != '' else []
         return transcribed
@@ -1,18 +1,10 @@
 # -*- coding: utf-8 -*-
 import os
 import logging
-import tempfile
-try:
-    import cmuclmtk
-except ImportError:
-    pass
 from .g2p import PhonetisaurusG2P
+from core import ngram
 from core import profile
-
-
-def delete_temp_file(file_to_delete):
-    if True:
-        os.remove(file_to_delete)
+from core import vocabcompiler
 
 
 def get_languagemodel_path(path):
@@ -31,13 +23,15 @@ def get_dictionary_path(path):
     return os.path.join(path, 'dictionary')
 
 
-def compile_vocabulary(directory, phrases):
+def compile_vocabulary(directory, phrases, diff=None):
     """
     Compiles the vocabulary to the Pocketsphinx format by creating a
     languagemodel and a dictionary.
 
     Arguments:
         phrases -- a list of phrases that this vocabulary will contain
+        diff -- (optional) the changes since the vocabulary was last
+                compiled, if given the existing dictionary is patched
     """
     logger = logging.getLogger(__name__)
     languagemodel_path = get_languagemodel_path(directory)
@@ -72,66 +66,71 @@ def compile_vocabulary(directory, phrases):
 
     logger.debug('Languagemodel path: %s' % languagemodel_path)
     logger.debug('Dictionary path:    %s' % dictionary_path)
-    text = " ".join(
-        [("<s> %s </s>" % phrase.upper()) for phrase in phrases]
-    )
-    # There's some strange issue when text2idngram sometime can't find any
-    # input (although it's there). For a reason beyond me, this can be fixed
-    # by appending a space char to the string.
-    text += ' '
     logger.debug('Compiling languagemodel...')
-    vocabulary = compile_languagemodel(text, languagemodel_path)
+    vocabulary = compile_languagemodel(
+        [phrase.upper() for phrase in phrases],
+        languagemodel_path
+    )
     logger.debug('Starting dictionary...')
-    compile_dictionary(g2pconverter, vocabulary, dictionary_path)
-
-
-def compile_languagemodel(text, output_file):
+    known = None
+    if diff is not None and os.path.exists(dictionary_path):
+        # Keep the pronunciations of the words that are still used, the
+        # language model has to be rebuilt either way
+        known = {
+            word: pronunciations
+            for word, pronunciations in vocabcompiler.read_dictionary(
+                dictionary_path
+            ).items()
+            if word not in diff.removed_words
+        }
+        logger.debug('Patching dictionary: {}'.format(diff))
+    compile_dictionary(g2pconverter, vocabulary, dictionary_path, known=known)
+
+
+def compile_languagemodel(phrases, output_file):
     """
-    Compiles the languagemodel from a text.
+    Compiles the languagemodel from a list of phrases.
 
     Arguments:
-        text -- the text the languagemodel will be generated from
+        phrases -- the phrases the languagemodel will be generated from
         output_file -- the path of the file this languagemodel will
                        be written to
 
     Returns:
         A list of all unique words this vocabulary contains.
     """
-    if len(text.strip()) == 0:
+    if not any(phrase.strip() for phrase in phrases):
         raise ValueError('No text to compile into languagemodel!')
 
     logger = logging.getLogger(__name__)
 
-    with tempfile.NamedTemporaryFile(suffix='.vocab', delete=False) as f:
-        vocab_file = f.name
-
-    # Create vocab file from text
-    logger.debug("Creating vocab file: '%s'" % vocab_file)
-    cmuclmtk.text2vocab(text, vocab_file)
-
-    # Get words from vocab file
-    logger.debug("Getting words from vocab file and removing it afterwards...")
-    words = []
-    with open(vocab_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line.startswith('#') and line not in ('<s>', '</s>') and "{" not in line and "}" not in line:
-                words.append(line)
-
+    order = int(profile.get(['pocketsphinx', 'lm_order'], 3))
+    smoothing = profile.get(['pocketsphinx', 'lm_smoothing'], 'witten_bell')
+    logger.debug(
+        "Creating {}-gram languagemodel file with {} smoothing: '{}'".format(
+            order,
+            smoothing,
+            output_file
+        )
+    )
+    # Intent keyword slots like {LocationKeyword} stay in the language
+    # model but are not words that need a pronunciation
+    words = [
+        word for word in ngram.compile_arpa(
+            phrases,
+            output_file,
+            order=order,
+            smoothing=smoothing
+        )
+        if "{" not in word and "}" not in word
+    ]
     if len(words) == 0:
-        logger.warning('Vocab file seems to be empty!')
-
-    # Create language model from text
-    logger.debug("Creating languagemodel file: '%s'" % output_file)
-    cmuclmtk.text2lm(text, output_file, vocab_file=vocab_file)
-
-    # Remote the vocab file
-    delete_temp_file(vocab_file)
+        logger.warning('Vocabulary seems to be empty!')
 
     return words
 
 
-def compile_dictionary(g2pconverter, words, output_file):
+def compile_dictionary(g2pconverter, words, output_file, known=None):
     """
     Compiles the dictionary from a list of words.
 
@@ -139,20 +138,39 @@ def compile_dictionary(g2pconverter, words, output_file):
         words -- a list of all unique words this vocabulary contains
         output_file -- the path of the file this dictionary will
                        be written to
+        known -- (optional) pronunciations that are already known, as
+                 word: [pronunciation, ...] with the words in lower case.
+                 Only the other words are looked up.
     """
     # create the dictionary
     logger = logging.getLogger(__name__)
+    known = known or {}
+    phonemes = {
+        word.upper(): known[word.lower()]
+        for word in words if word.lower() in known
+    }
+    words = [word for word in words if word.lower() not in known]
     logger.debug("Getting phonemes for %d words..." % len(words))
-    try:
-        phonemes = g2pconverter.translate([word.upper() for word in words])
-        logger.debug(phonemes)
-    except ValueError as e:
-        print(str(e))
-        if str(e) == 'Input symbol not found':
+    if words:
+        try:
+            phonemes.update(
+                g2pconverter.translate([word.upper() for word in words])
+            )
+            logger.debug(phonemes)
+        except ValueError as e:
+            # phonetisaurus-g2pfst fails the whole batch, the in-process
+            # G2P service only leaves the word out
+            if str(e) != 'Input symbol not found':
+                raise
+        missing = [word for word in words if word.upper() not in phonemes]
+        if missing:
             logger.debug("Upper failed trying lower()")
-            phonemes = g2pconverter.translate([word.lower() for word in words])
-        else:
-            raise e
+            phonemes.update(
+                (word.upper(), pronunciations)
+                for word, pronunciations in g2pconverter.translate(
+                    [word.lower() for word in missing]
+                ).items()
+            )
 
     logger.debug("Creating dict file: '%s'" % output_file)
     with open(output_file, "w") as f:
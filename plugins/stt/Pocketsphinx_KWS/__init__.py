@@ -2,6 +2,7 @@
 import os.path
 import re
 import tempfile
+import wave
 from collections import OrderedDict
 from core import paths
 from core import plugin
@@ -129,7 +130,8 @@ class PocketsphinxKWSPlugin(plugin.STTPlugin):
         )
 
         vocabulary_path = self.compile_vocabulary(
-            sphinxvocab.compile_vocabulary
+            sphinxvocab.compile_vocabulary,
+            incremental=True
         )
 
         dict_path = sphinxvocab.get_dictionary_path(vocabulary_path)
@@ -322,9 +324,28 @@ class PocketsphinxKWSPlugin(plugin.STTPlugin):
         Arguments:
             fp -- a file object containing audio data
         """
+        with wave.open(fp, 'rb') as w:
+            return self.transcribe_pcm(
+                w.readframes(w.getnframes()),
+                w.getframerate(),
+                w.getsampwidth(),
+                w.getnchannels()
+            )
+
+    def transcribe_pcm(self, buffer, rate, width, channels):
+        """
+        Performs STT on raw PCM audio held in memory.
+
+        Arguments:
+            buffer -- a bytes-like object containing 16 bit mono audio
+            rate -- the sample rate in Hz
+            width -- the sample width in bytes
+            channels -- the number of channels
+        """
         transcribed = []
-        fp.seek(44)
-        audio_data = fp.read()
+        audio_data = buffer
+        if not isinstance(audio_data, bytes):
+            audio_data = bytes(audio_data)
         while True:
             try:
                 self._ps.start_utt()
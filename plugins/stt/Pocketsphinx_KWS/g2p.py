@@ -3,6 +3,8 @@ import os
 import phonetisaurus
 import re
 import logging
+from core import g2pservice
+from core import pronunciationcache
 from . import phonemeconversion
 
 
@@ -44,12 +46,43 @@ class PhonetisaurusG2P(object):
         return self._translate_words([word])
 
     def _translate_words(self, words):
-        return phonetisaurus.predict(
+        cache = pronunciationcache.get_cache()
+        if cache is None:
+            output = self._lookup_words(words)
+        else:
+            # Only the words that aren't cached yet go to Phonetisaurus
+            output = cache.translate(
+                self.fst_model,
+                self.nbest,
+                self.fst_model_alphabet,
+                words,
+                self._lookup_words
+            )
+        return [
+            (word, pronunciation.split())
+            for word, pronunciations in output.items()
+            for pronunciation in pronunciations
+        ]
+
+    def _lookup_words(self, words):
+        # The service keeps the model loaded between vocabulary compiles
+        # and only falls back to phonetisaurus.predict if it can't
+        return g2pservice.get_service(self.fst_model).translate(
             words,
-            self.fst_model,
-            nbest=self.nbest
+            nbest=self.nbest,
+            fallback=self._predict_words
         )
 
+    def _predict_words(self, words, nbest):
+        result = {}
+        for word, phonemes in phonetisaurus.predict(
+            words,
+            self.fst_model,
+            nbest=nbest
+        ):
+            result.setdefault(word, []).append(" ".join(phonemes))
+        return result
+
     def translate(self, words):
         self._logger.debug(
             'Converting {} word{} to phonemes'.format(
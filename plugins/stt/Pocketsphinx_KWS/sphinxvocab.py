@@ -5,6 +5,7 @@ import re
 import tempfile
 from .g2p import PhonetisaurusG2P
 from core import profile
+from core import vocabcompiler
 
 
 def delete_temp_file(file_to_delete):
@@ -36,13 +37,15 @@ def get_thresholds_path(path):
     return os.path.join(path, 'kws.thresholds')
 
 
-def compile_vocabulary(directory, phrases):
+def compile_vocabulary(directory, phrases, diff=None):
     """
     Compiles the vocabulary to the Pocketsphinx format by creating a
     languagemodel and a dictionary.
 
     Arguments:
         phrases -- a list of phrases that this vocabulary will contain
+        diff -- (optional) the changes since the vocabulary was last
+                compiled, if given the existing dictionary is patched
     """
     logger = logging.getLogger(__name__)
     languagemodel_path = get_languagemodel_path(directory)
@@ -85,7 +88,18 @@ def compile_vocabulary(directory, phrases):
     logger.debug('Compiling languagemodel...')
     vocabulary = compile_lexicon(text)
     logger.debug('Starting dictionary...')
-    compile_dictionary(g2pconverter, vocabulary, dictionary_path)
+    known = None
+    if diff is not None and os.path.exists(dictionary_path):
+        # Keep the pronunciations of the words that are still used
+        known = {
+            word: [pronunciation.split() for pronunciation in pronunciations]
+            for word, pronunciations in vocabcompiler.read_dictionary(
+                dictionary_path
+            ).items()
+            if word not in diff.removed_words
+        }
+        logger.debug('Patching dictionary: {}'.format(diff))
+    compile_dictionary(g2pconverter, vocabulary, dictionary_path, known=known)
 
 
 def compile_lexicon(text):
@@ -119,16 +133,13 @@ def compile_lexicon(text):
     return words
 
 
-def compile_dictionary(g2pconverter, corpus, output_file):
+def read_cmudict():
     """
-    Compiles the dictionary from a list of words.
+    Reads the standard dictionary that comes with the acoustic model.
 
-    Arguments:
-        corpus -- the text the dictionary will be generated from
-        output_file -- the path of the file this dictionary will
-                       be written to
+    Returns:
+        A dictionary of word: [[phoneme, ...], ...]
     """
-    # read the standard dictionary in
     RE_WORDS = re.compile(
         r"^(?P<word>[a-zA-Z0-9'\.\-]+)(\(\d\))?\s+(?P<pronunciation>[a-zA-Z]+.*[a-zA-Z0-9])\s*$"
     )
@@ -146,7 +157,23 @@ def compile_dictionary(g2pconverter, corpus, output_file):
                         match.group('pronunciation').split()
                     ]
             line = f.readline().strip()
+    return lexicon
+
+
+def compile_dictionary(g2pconverter, corpus, output_file, known=None):
+    """
+    Compiles the dictionary from a list of words.
 
+    Arguments:
+        corpus -- the text the dictionary will be generated from
+        output_file -- the path of the file this dictionary will
+                       be written to
+        known -- (optional) pronunciations that are already known, as
+                 word: [[phoneme, ...], ...]. Only the other words are
+                 looked up.
+    """
+    logger = logging.getLogger(__name__)
+    known = known or {}
     # create a list of words from the corpus
     corpus_lexicon = {}
     words = set()
@@ -154,15 +181,23 @@ def compile_dictionary(g2pconverter, corpus, output_file):
         for word in line.split():
             words.add(word.lower())
 
-    # Fetch pronunciations for every word in corpus
+    # Fetch pronunciations for every word in corpus, guessing the ones
+    # missing from the dictionary in a single batch
+    unknown = [word for word in words if word not in known]
+    lexicon = read_cmudict() if unknown else {}
+    missing = []
     for word in words:
-        if word in lexicon:
+        if word in known:
+            corpus_lexicon[word] = known[word]
+        elif word in lexicon:
             corpus_lexicon[word] = lexicon[word]
         else:
             corpus_lexicon[word] = []
-            for w, p in g2pconverter.translate([word]):
-                print(f"{w} - {p}")
-                corpus_lexicon[word].append(p)
+            missing.append(word)
+    if missing:
+        for w, p in g2pconverter.translate(missing):
+            logger.debug(f"{w} - {p}")
+            corpus_lexicon.setdefault(w.lower(), []).append(p)
     with open(output_file, "w") as f:
         for word in sorted(corpus_lexicon):
             for index, phones in enumerate(corpus_lexicon[word]):
@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
-import audioop
-import math
 import unittest
+from core import pcm
 from core import plugin
 from core import profile
+from core import vadstats
 from core import visualizations
 
 
@@ -21,8 +21,6 @@ from core import visualizations
 # over twice the length of timeout, then the recorded audio
 # is returned for processing.
 class SNRPlugin(plugin.VADPlugin, unittest.TestCase):
-    _maxsnr = None
-    _minsnr = None
     _visualizations = []
 
     def __init__(self, *args, **kwargs):
@@ -35,86 +33,39 @@ class SNRPlugin(plugin.VADPlugin, unittest.TestCase):
         threshold = profile.get_profile_var(["snr_vad", "threshold"], 30)
         super(SNRPlugin, self).__init__(input_device, timeout, minimum_capture)
         # if the audio decibel is greater than threshold, then consider this
-        # having detected a voice.
-        self._threshold = threshold
-        # Keep track of the number of audio levels
-        self.distribution = {}
+        # having detected a voice. The threshold follows the typical audio
+        # level.
+        self._stats = vadstats.SNRStatistics(
+            threshold=threshold,
+            tolerance=profile.get(['snr_vad', 'tolerance'], 1),
+            chunktime=self._chunktime
+        )
 
     def _voice_detected(self, *args, **kwargs):
         frame = args[0]
         recording = False
         if "recording" in kwargs:
             recording = kwargs["recording"]
-        rms = audioop.rms(frame, int(self._input_device._input_bits / 8))
-        if rms > 0 and self._threshold > 0:
-            snr = round(20.0 * math.log(rms / self._threshold, 10))
-        else:
-            snr = 0
-        if snr in self.distribution:
-            self.distribution[snr] += 1
+        if kwargs.get("rms") is not None:
+            # already calculated by segment_file()
+            level = kwargs["rms"]
         else:
-            self.distribution[snr] = 1
-        # calculate the mean and standard deviation
-        sum1 = sum([
-            value * (key ** 2) for key, value in self.distribution.items()
-        ])
-        items = sum([value for value in self.distribution.values()])
-        if items > 1:
-            # mean = sum( value * freq )/items
-            mean = sum(
-                [key * value for key, value in self.distribution.items()]
-            ) / items
-            stddev = math.sqrt((sum1 - (items * (mean ** 2))) / (items - 1))
-            self._threshold = mean + (
-                stddev * profile.get(
-                    ['snr_vad', 'tolerance'],
-                    1
-                )
-            )
-            # We'll say that the max possible value for SNR is mean+3*stddev
-            if self._minsnr is None:
-                self._minsnr = snr
-            if self._maxsnr is None:
-                self._maxsnr = snr
-            maxsnr = mean + 3 * stddev
-            if snr > maxsnr:
-                maxsnr = snr
-            if maxsnr > self._maxsnr:
-                self._maxsnr = maxsnr
-            minsnr = mean - 3 * stddev
-            if snr < minsnr:
-                minsnr = snr
-            if minsnr < self._minsnr:
-                self._minsnr = minsnr
+            level = pcm.Frame(
+                frame,
+                int(self._input_device._input_bits / 8),
+                self._input_device._input_channels
+            ).level()
+        voice = self._stats.update(level, recording)
+        payload = self._stats.visualization(recording)
+        if payload is not None:
             # Loop through visualization plugins
-            visualizations.run_visualization(
-                "mic_volume",
-                recording=recording,
-                snr=snr,
-                minsnr=self._minsnr,
-                maxsnr=self._maxsnr,
-                mean=mean,
-                threshold=self._threshold
-            )
-        if(items > 100):
-            # Every 50 samples (about 1-3 seconds), rescale,
-            # allowing changes in the environment to be
-            # recognized more quickly.
-            self.distribution = {
-                key: (
-                    (value + 1) / 2
-                ) for key, value in self.distribution.items() if value > 1
-            }
-        threshold = self._threshold
-        # If we are already recording, reduce the threshold so as
-        # the user's voice trails off, we continue to record.
-        # Here I am setting it to the halfway point between threshold
-        # and mean.
-        if(recording):
-            threshold = (mean + threshold) / 2
-        if(snr < threshold):
+            visualizations.dispatch_visualization("mic_volume", **payload)
+        if not voice:
             response = False
         else:
-            self._logger.info("Voice Detected: {}/{}".format(snr, threshold))
+            self._logger.info("Voice Detected: {}/{}".format(
+                self._stats.snr,
+                self._stats.threshold
+            ))
             response = True
         return response
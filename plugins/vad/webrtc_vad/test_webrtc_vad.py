@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
+import copy
 import logging
+from core import profile
 from core import testutils
 from . import webrtc_vad
 
@@ -16,3 +18,19 @@ class TestWebRTC_VADPlugin(testutils.Test_VADPlugin):
         # detecting audio. Skip if not in INFO logging level.
         if(self._logger.getEffectiveLevel() < logging.WARN):
             self.map_file()
+
+
+class TestWebRTC_VADPlugin_Smoothing(testutils.Test_VADPlugin):
+
+    def setUp(self):
+        super(TestWebRTC_VADPlugin_Smoothing, self).setUp()
+        smoothing_profile = copy.deepcopy(testutils.test_profile())
+        smoothing_profile['webrtc_vad'] = {
+            'smoothing': True,
+            'use_snr': False
+        }
+        profile.set_profile(smoothing_profile)
+        self.plugin = testutils.get_plugin_instance(
+            webrtc_vad.WebRTCPlugin,
+            self._test_input
+        )
@@ -2,19 +2,18 @@
 # This allows you to use the webrtcvad plugin.
 # You should be able to install it with a simple
 # pip install webrtcvad
-import audioop
+import collections
 import logging
-import math
 import unittest
 import webrtcvad
+from core import pcm
 from core import plugin
 from core import profile
+from core import vadstats
 from core import visualizations
 
 
 class WebRTCPlugin(plugin.VADPlugin, unittest.TestCase):
-    _maxsnr = None
-    _minsnr = None
     _visualizations = []
 
     # Timeout in seconds
@@ -32,181 +31,145 @@ class WebRTCPlugin(plugin.VADPlugin, unittest.TestCase):
         )
 
         threshold = profile.get_profile_var(["webrtc_vad", "threshold"], 30)
+        # From the website:
+        #
+        # https://github.com/wiseman/py-webrtcvad
+        #
+        # The WebRTC VAD only accepts 16-bit mono PCM audio, sampled at
+        # 8000, 16000, 32000 or 48000 Hz. A frame must be either 10, 20,
+        # or 30 ms in duration.
+        #
+        # The audio from the input device is cut into frames of that
+        # length, so the input chunksize can be anything.
+        chunk_ms = round(
+            1000 * input_device._input_chunksize / input_device._input_rate
+        )
+        frame_ms = profile.get_profile_var(
+            ["webrtc_vad", "frame_ms"],
+            chunk_ms if chunk_ms in [10, 20, 30] else 30
+        )
+        if frame_ms not in [10, 20, 30]:
+            raise ValueError(
+                "\n".join([
+                    "When using WebRTCVAD, frames are limited to 10, 20,",
+                    "or 30 milliseconds in length, not {}.",
+                    "Please adjust the value of",
+                    "webrtc_vad: ",
+                    "  frame_ms:",
+                    "in your ~/.config/naomi/configs/profile.yml file."
+                ]).format(frame_ms)
+            )
         super(WebRTCPlugin, self).__init__(
             input_device,
             timeout,
-            minimum_capture
+            minimum_capture,
+            frame_size=input_device._input_rate * frame_ms // 1000
         )
         # if the audio decibel is greater than threshold, then consider this
-        # having detected a voice.
-        self._threshold = threshold
-        # Keep track of the number of audio levels
-        self.distribution = {}
+        # having detected a voice. The threshold follows the typical audio
+        # level.
+        self._stats = vadstats.SNRStatistics(
+            threshold=threshold,
+            tolerance=profile.get(['snr_vad', 'tolerance'], 1),
+            minimum_stddev=1,
+            chunktime=self._chunktime
+        )
 
         self._logger.info("timeout: {}".format(timeout))
         self._logger.info("minimum_capture: {}".format(minimum_capture))
         self._logger.info("aggressiveness: {}".format(aggressiveness))
-        super(WebRTCPlugin, self).__init__(
-            input_device,
-            timeout,
-            minimum_capture
-        )
+        self._logger.info("frame length: {} ms".format(frame_ms))
         if aggressiveness not in [0, 2, 3]:
             aggressiveness = 1
         self._vad = webrtcvad.Vad(aggressiveness)
-        if(self._chunktime not in [0.01, 0.02, 0.03]):
-            # From the website:
-            #
-            # https://github.com/wiseman/py-webrtcvad
-            #
-            # The WebRTC VAD only accepts 16-bit mono PCM audio, sampled at
-            # 8000, 16000, 32000 or 48000 Hz. A frame must be either 10, 20,
-            # or 30 ms in duration:
-            raise ValueError(
-                "\n".join([
-                    "When using WebRTCVAD, chunks are limited to 10, 20,",
-                    "or 30 millisends in length.",
-                    "At current input rate of {}, the allowed chunk sizes are",
-                    "{} (10ms), {} (20ms) or {} (30 ms).",
-                    "Please adjust the value of",
-                    "audio: ",
-                    "  input_chunksize:",
-                    "in your ~/.config/naomi/configs/profile.yml file."
-                ]).format(
-                    input_device._input_rate,
-                    input_device._input_rate * 0.01,
-                    input_device._input_rate * 0.02,
-                    input_device._input_rate * 0.03
-                )
-            )
+        # Gate webrtcvad with the signal to noise ratio, as snr_vad does
+        self._use_snr = profile.get_profile_flag(
+            ["webrtc_vad", "use_snr"],
+            True
+        )
+        # Instead of asking webrtcvad about the whole frame, ask it about
+        # every 10 ms of the frame and decide based on the share of voiced
+        # subframes over the last "window" seconds
+        self._smoothing = profile.get_profile_flag(
+            ["webrtc_vad", "smoothing"],
+            False
+        )
+        window = profile.get_profile_var(["webrtc_vad", "window"], 0.3)
+        self._onset_ratio = profile.get_profile_var(
+            ["webrtc_vad", "onset_ratio"],
+            0.6
+        )
+        self._offset_ratio = profile.get_profile_var(
+            ["webrtc_vad", "offset_ratio"],
+            0.9
+        )
+        self._subframe_bytes = input_device._input_rate // 100 * 2
+        self._decisions = collections.deque(
+            maxlen=max(1, round(window * 100))
+        )
+        self._voiced = 0
+        self._logger.info("use_snr: {}".format(self._use_snr))
+        self._logger.info("smoothing: {}".format(self._smoothing))
 
     def _voice_detected(self, *args, **kwargs):
-        frame = args[0]
-        # self._logger.info("Frame length: {} bytes".format(len(frame)))
-        # The frame length must be either .01, .02 or .02 ms.
-        # Sometimes the audio card will refuse to obey the chunksize
-        # directive. In this case, we have to cut down the sample to
-        # fit the next smaller unit
-        sample_rate = self._input_device._input_rate
-        input_bytes = self._input_device._input_bits / 8
-        sample_length = len(frame) / input_bytes / sample_rate
-        if not((
-            sample_length == 0.01
-        ) or (
-            sample_length == 0.02
-        ) or (
-            sample_length == 0.03
-        )):
-            if(sample_length > 0.03):
-                self._logger.info(
-                    "Reducing buf length from {} to {} (0.03 seconds)".format(
-                        len(frame),
-                        int(sample_rate * input_bytes * 0.03)
-                    )
-                )
-                frame = frame[:int(sample_rate * input_bytes * 0.03)]
-            elif(sample_length > 0.02):
-                self._logger.info(
-                    "Reducing buf length from {} to {} (0.02 seconds)".format(
-                        len(frame),
-                        int(sample_rate * input_bytes * 0.02)
-                    )
-                )
-                frame = frame[:int(sample_rate * input_bytes * 0.02)]
-            elif(sample_length > 0.01):
-                self._logger.info(
-                    "Reducing buf length from {} to {} (0.01 seconds)".format(
-                        len(frame),
-                        int(sample_rate * input_bytes * 0.01)
-                    )
-                )
-                frame = frame[:int(sample_rate * input_bytes * 0.01)]
-            else:
-                raise Exception(
-                    "Buffer length {} less than minimum of {}".format(
-                        len(frame),
-                        int(sample_rate * input_bytes * 0.01)
-                    )
-                )
-        frame = args[0]
+        frame = pcm.Frame(
+            args[0],
+            int(self._input_device._input_bits / 8),
+            self._input_device._input_channels
+        )
+        # webrtcvad only accepts 16 bit mono audio, so mix the channels
+        # down (this is a no-op for 16 bit mono input)
+        mono = frame.downmix()
         recording = False
         if "recording" in kwargs:
             recording = kwargs["recording"]
-        rms = audioop.rms(frame, int(self._input_device._input_bits / 8))
-        if rms > 0 and self._threshold > 0:
-            snr = round(20.0 * math.log(rms / self._threshold, 10))
-        else:
-            snr = 0
-        if snr in self.distribution:
-            self.distribution[snr] += 1
-        else:
-            self.distribution[snr] = 1
-        # calculate the mean and standard deviation
-        sum1 = sum([
-            value * (key ** 2) for key, value in self.distribution.items()
-        ])
-        items = sum([value for value in self.distribution.values()])
-        if items > 1:
-            # mean = sum( value * freq )/items
-            mean = sum(
-                [key * value for key, value in self.distribution.items()]
-            ) / items
-            stddev = math.sqrt((sum1 - (items * (mean ** 2))) / (items - 1))
-            if stddev < 1:
-                stddev = 1
-            self._threshold = mean + (
-                stddev * profile.get(
-                    ['snr_vad', 'tolerance'],
-                    1
-                )
-            )
-            # We'll say that the max possible value for SNR is mean+3*stddev
-            if self._minsnr is None:
-                self._minsnr = snr
-            if self._maxsnr is None:
-                self._maxsnr = snr
-            maxsnr = mean + 3 * stddev
-            if snr > maxsnr:
-                maxsnr = snr
-            if maxsnr > self._maxsnr:
-                self._maxsnr = maxsnr
-            minsnr = mean - 3 * stddev
-            if snr < minsnr:
-                minsnr = snr
-            if minsnr < self._minsnr:
-                self._minsnr = minsnr
-            # Loop through visualization plugins
-            visualizations.run_visualization(
-                "mic_volume",
-                recording=recording,
-                snr=snr,
-                minsnr=self._minsnr,
-                maxsnr=self._maxsnr,
-                mean=mean,
-                threshold=self._threshold
+        loud = True
+        if self._use_snr:
+            if kwargs.get("rms") is not None:
+                # already calculated by segment_file()
+                rms = kwargs["rms"]
+            else:
+                rms = frame.level()
+            loud = self._loud_enough(rms, recording)
+        if self._smoothing:
+            # Every subframe goes through webrtcvad, even when it is too
+            # quiet, so the window always covers the most recent audio
+            response = self._smoothed_speech(mono, recording) and loud
+        elif loud:
+            response = self._vad.is_speech(
+                mono,
+                self._input_device._input_rate
             )
-        if(items > 100):
-            # Every 50 samples (about 1-3 seconds), rescale,
-            # allowing changes in the environment to be
-            # recognized more quickly.
-            self.distribution = {
-                key: (
-                    (value + 1) / 2
-                ) for key, value in self.distribution.items() if value > 1
-            }
-        threshold = self._threshold
-        # If we are already recording, reduce the threshold so as
-        # the user's voice trails off, we continue to record.
-        # Here I am setting it to the halfway point between threshold
-        # and mean.
-        if(recording):
-            threshold = (mean + threshold) / 2
-        if(snr < threshold):
-            response = False
         else:
-            if(self._vad.is_speech(frame, self._input_device._input_rate)):
-                response = True
-                self._logger.info("Voice detected")
-            else:
-                response = False
+            response = False
+        if response:
+            self._logger.info("Voice detected")
         return response
+
+    # Runs webrtcvad on every 10 ms subframe and remembers the decisions
+    # for the length of the window. Speech starts once the share of voiced
+    # subframes in the window reaches the onset ratio, and continues until
+    # the share of unvoiced subframes reaches the offset ratio.
+    def _smoothed_speech(self, mono, recording):
+        rate = self._input_device._input_rate
+        step = self._subframe_bytes
+        for start in range(0, len(mono) - step + 1, step):
+            voiced = self._vad.is_speech(mono[start:start + step], rate)
+            if len(self._decisions) == self._decisions.maxlen:
+                self._voiced -= self._decisions[0]
+            self._decisions.append(voiced)
+            self._voiced += voiced
+        ratio = self._voiced / self._decisions.maxlen
+        if recording:
+            return (1 - ratio) < self._offset_ratio
+        return ratio >= self._onset_ratio
+
+    # Keeps the statistics of the signal to noise ratio up to date and
+    # returns True if this frame stands out from the background noise
+    def _loud_enough(self, rms, recording):
+        loud = self._stats.update(rms, recording)
+        payload = self._stats.visualization(recording)
+        if payload is not None:
+            # Loop through visualization plugins
+            visualizations.dispatch_visualization("mic_volume", **payload)
+        return loud
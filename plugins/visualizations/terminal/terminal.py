@@ -6,7 +6,12 @@ from core import plugin
 
 
 class TerminalVisualizationsPlugin(plugin.VisualizationsPlugin):
-    @classmethod
+    def __init__(self, *args, **kwargs):
+        super(TerminalVisualizationsPlugin, self).__init__(*args, **kwargs)
+        # The width is looked up again every time it is read, so one
+        # Terminal is enough even if the window is resized
+        self._terminal = Terminal()
+
     def mic_volume(self, *args, **kwargs):
         try:
             recording = kwargs['recording']
@@ -18,28 +23,26 @@ class TerminalVisualizationsPlugin(plugin.VisualizationsPlugin):
         except KeyError:
             return
         try:
-            displaywidth = Terminal().width - 6
+            displaywidth = self._terminal.width - 6
         except TypeError:
             displaywidth = 20
         snrrange = maxsnr - minsnr
         if snrrange == 0:
             snrrange = 1  # to avoid divide by zero below
 
-        feedback = ["+"] if recording else ["-"]
-        feedback.extend(
-            list("".join([
-                "||",
-                ("=" * int(displaywidth * ((snr - minsnr) / snrrange))),
-                ("-" * int(displaywidth * ((maxsnr - snr) / snrrange))),
-                "||"
-            ]))
-        )
+        feedback = bytearray(b"".join([
+            b"+" if recording else b"-",
+            b"||",
+            b"=" * int(displaywidth * ((snr - minsnr) / snrrange)),
+            b"-" * int(displaywidth * ((maxsnr - snr) / snrrange)),
+            b"||"
+        ]))
         # insert markers for mean and threshold
         if (minsnr < mean < maxsnr):
-            feedback[int(displaywidth * ((mean - minsnr) / snrrange))] = 'm'
+            feedback[int(displaywidth * ((mean - minsnr) / snrrange))] = ord('m')
         if (minsnr < threshold < maxsnr):
-            feedback[int(displaywidth * ((threshold - minsnr) / snrrange))] = 't'
-        println("".join(feedback))
+            feedback[int(displaywidth * ((threshold - minsnr) / snrrange))] = ord('t')
+        println(feedback.decode())
 
     @staticmethod
     def output(message, timestamp=True):
@@ -5,7 +5,6 @@ import collections
 import contextlib
 import itertools
 import json
-import math
 import os
 import sys
 import tempfile
@@ -13,6 +12,8 @@ import threading
 import unittest
 import wave
 from blessings import Terminal
+from core import noisefloor
+from core import vadstats
 from datetime import datetime
 from vosk import Model, KaldiRecognizer
 
@@ -224,8 +225,6 @@ class AlsaAudioProcessor(AudioProcessor):
 # over twice the length of timeout, then the recorded audio
 # is returned for processing.
 class SNRVAD:
-    _maxsnr = None
-    _minsnr = None
     _visualizations = []
 
     def __init__(self, *args, **kwargs):
@@ -233,10 +232,12 @@ class SNRVAD:
         minimum_capture = 0.5
         threshold = 30
         # if the audio decibel is greater than threshold, then consider this
-        # having detected a voice.
-        self._threshold = threshold
-        # Keep track of the number of audio levels
-        self.distribution = {}
+        # having detected a voice. The threshold follows the typical audio
+        # level.
+        self._stats = vadstats.SNRStatistics(
+            threshold=threshold,
+            estimator=noisefloor.HistogramEstimator()
+        )
 
     def _voice_detected(self, *args, **kwargs):
         frame = args[0]
@@ -244,70 +245,10 @@ class SNRVAD:
         if "recording" in kwargs:
             recording = kwargs["recording"]
         rms = audioop.rms(frame, int(kwargs['input_bits'] / 8))
-        if rms > 0 and self._threshold > 0:
-            snr = round(20.0 * math.log(rms / self._threshold, 10))
-        else:
-            snr = 0
-        if snr in self.distribution:
-            self.distribution[snr] += 1
-        else:
-            self.distribution[snr] = 1
-        # calculate the mean and standard deviation
-        sum1 = sum([
-            value * (key ** 2) for key, value in self.distribution.items()
-        ])
-        items = sum([value for value in self.distribution.values()])
-        if items > 1:
-            # mean = sum( value * freq )/items
-            mean = sum(
-                [key * value for key, value in self.distribution.items()]
-            ) / items
-            stddev = math.sqrt((sum1 - (items * (mean ** 2))) / (items - 1))
-            self._threshold = mean + stddev
-            # We'll say that the max possible value for SNR is mean+3*stddev
-            if self._minsnr is None:
-                self._minsnr = snr
-            if self._maxsnr is None:
-                self._maxsnr = snr
-            maxsnr = mean + 3 * stddev
-            if snr > maxsnr:
-                maxsnr = snr
-            if maxsnr > self._maxsnr:
-                self._maxsnr = maxsnr
-            minsnr = mean - 3 * stddev
-            if snr < minsnr:
-                minsnr = snr
-            if minsnr < self._minsnr:
-                self._minsnr = minsnr
-            # Loop through visualization plugins
-            mic_volume(
-                recording=recording,
-                snr=snr,
-                minsnr=self._minsnr,
-                maxsnr=self._maxsnr,
-                mean=mean,
-                threshold=self._threshold
-            )
-        if(items > 100):
-            # Every 50 samples (about 1-3 seconds), rescale,
-            # allowing changes in the environment to be
-            # recognized more quickly.
-            self.distribution = {
-                key: (
-                    (value + 1) / 2
-                ) for key, value in self.distribution.items() if value > 1
-            }
-        threshold = self._threshold
-        # If we are already recording, reduce the threshold so as
-        # the user's voice trails off, we continue to record.
-        # Here I am setting it to the halfway point between threshold
-        # and mean.
-        if(recording):
-            threshold = (mean + threshold) / 2
-        if(snr < threshold):
-            response = False
-        else:
-            response = True
+        response = self._stats.update(rms, recording)
+        payload = self._stats.visualization(recording)
+        if payload is not None:
+            mic_volume(**payload)
         return response
 
 